@@ -0,0 +1,33 @@
+"""
+Gunicorn settings for serving the project over ASGI with uvicorn workers.
+
+    gunicorn -c config/gunicorn.conf.py config.asgi:application
+
+Each worker runs one event loop, and the async tracking views (ASYNC_VIEWS)
+wait on the cache, database and Nominatim without holding a thread, so one
+worker per core serves many concurrent tracking pages. For the plain WSGI
+setup run `gunicorn config.wsgi` without this file.
+"""
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+
+worker_class = 'uvicorn_worker.UvicornWorker'
+# Async workers don't need the usual 2 x cores + 1: the event loop, not a
+# process, is what waits on I/O
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+
+raw_env = [f"ASYNC_VIEWS={os.getenv('ASYNC_VIEWS', 'true')}"]
+
+# Requests that hit Nominatim are bounded by GEOCODE_CONNECT/READ_TIMEOUT well below this
+timeout = 30
+graceful_timeout = 30
+keepalive = 5
+
+# Recycle workers now and then so a slow leak in plotly or reportlab can't grow unbounded
+max_requests = 2000
+max_requests_jitter = 200
+
+accesslog = '-'
+errorlog = '-'
@@ -13,7 +13,8 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 from pathlib import Path
 import os
 from dotenv import load_dotenv
-from urllib.parse import urlparse
+
+from config.database import parse_database_url
 
 # Load environment variables
 load_dotenv()
@@ -49,7 +50,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
-    'whitenoise.middleware.WhiteNoiseMiddleware',  # Add Whitenoise here
+    # Whitenoise, made async-capable so ASGI requests stay on the event loop
+    'consignment.middleware.StaticFilesMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -78,29 +80,22 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'config.wsgi.application'
+ASGI_APPLICATION = 'config.asgi.application'
+
+# Serve package_detail and track_package from their async versions. Turn on when
+# running under ASGI (gunicorn -c config/gunicorn.conf.py); under WSGI each async
+# view would need an event loop of its own per request.
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', 'false').lower() in ('1', 'true', 'yes')
 
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
-# Parse database connection url
+# Parse database connection url; persistent connections, PgBouncer mode and
+# timeouts come from its query string (see config/database.py)
 DATABASE_URL = os.getenv('DATABASE_URL')
 if DATABASE_URL:
-    # Parse the URL
-    tmpPostgres = urlparse(DATABASE_URL)
-    
-    # Configure database
     DATABASES = {
-        'default': {
-            'ENGINE': 'django.db.backends.postgresql',
-            'NAME': tmpPostgres.path[1:],  # Remove leading slash
-            'USER': tmpPostgres.username,
-            'PASSWORD': tmpPostgres.password,
-            'HOST': tmpPostgres.hostname,
-            'PORT': tmpPostgres.port or '5432',
-            'OPTIONS': {
-                'sslmode': 'require'  # Required for NeonDB
-            }
-        }
+        'default': parse_database_url(DATABASE_URL, async_views=ASYNC_VIEWS),
     }
 else:
     # Fallback for local development
@@ -111,6 +106,51 @@ else:
         }
     }
 
+# Shared secret carriers send as "Authorization: Token <value>" to
+# /api/tracking-updates/; the endpoint is disabled while it is empty
+CARRIER_FEED_TOKEN = os.getenv('CARRIER_FEED_TOKEN', '')
+
+# Tracking-code lookups: cached results (seconds) and a per-IP token bucket
+TRACK_HIT_CACHE_TIMEOUT = 60 * 60 * 24
+TRACK_MISS_CACHE_TIMEOUT = 60
+TRACK_RATE_PER_MINUTE = int(os.getenv('TRACK_RATE_PER_MINUTE', 20))
+TRACK_BURST = int(os.getenv('TRACK_BURST', 10))
+# Proxies in front of the app that append to X-Forwarded-For (0: use REMOTE_ADDR)
+TRACK_TRUSTED_PROXY_COUNT = int(os.getenv('TRACK_TRUSTED_PROXY_COUNT', 0))
+
+# Sitemap shards are cached until a package in their pk range changes; pin the
+# URL base (e.g. https://chaselogix.com) so the Host header can't choose it
+SITEMAP_BASE_URL = os.getenv('SITEMAP_BASE_URL', '')
+SITEMAP_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Number of tracking events shown on the package page
+TRACKING_TIMELINE_LENGTH = 10
+# Rendered package page bodies are cached per package version for this long (seconds)
+PACKAGE_PAGE_CACHE_TIMEOUT = 60 * 60 * 24
+# Browser cache lifetimes (seconds); both responses carry ETag / Last-Modified for revalidation
+PACKAGE_PAGE_MAX_AGE = 0
+RECEIPT_MAX_AGE = 300
+
+# Tracking codes and package IDs are reserved from the database this many at a time
+ID_BLOCK_SIZE = 1000
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# Defaults to a per-process memory cache; point CACHE_BACKEND/CACHE_LOCATION at a
+# shared backend (e.g. FileBasedCache on a common path) to share it across workers.
+# Production needs the shared one: tracking lookups bypass a per-process cache and
+# the track rate limit counts per worker (`manage.py check --deploy` warns).
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'chaselogix'),
+        'TIMEOUT': 60 * 60 * 24,
+        'OPTIONS': {
+            'MAX_ENTRIES': 5000,
+        },
+    }
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -181,10 +221,57 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 MEDIA_URL = '/media/'
 
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
+# Variants written by `manage.py build_images`; collectstatic picks them up from here
+RESPONSIVE_IMAGE_ROOT = BASE_DIR / "static_build"
+RESPONSIVE_IMAGE_WIDTHS = (480, 960, 1600)
+
+# Per-page stylesheets for `manage.py build_css`: purged against the templates
+# (and CSS_PURGE_SCRIPTS), concatenated, minified and served next to the images
+CSS_BUNDLE_ROOT = RESPONSIVE_IMAGE_ROOT
+GOOGLE_FONTS_URL = (
+    "https://fonts.googleapis.com/css2?family=Roboto:wght@400;500;700"
+    "&family=Poppins:wght@300;400;500;600;700&display=swap"
+)
+CSS_BUNDLES = {
+    "index": {
+        "templates": ["index.html"],
+        "css": [
+            "css/bootstrap.min.css",
+            "css/bootstrap-icons.css",
+            "css/all.min.css",
+            "css/glightbox.min.css",
+            "css/swiper-bundle.min.css",
+            "css/main.css",
+        ],
+        "google_fonts": GOOGLE_FONTS_URL,
+    },
+    "package_detail": {
+        "templates": ["package_detail.html", "package_detail_body.html"],
+        "css": ["css/all.min.css", "css/package_detail.css"],
+        # package_status|lower, e.g. "in transit"
+        "safelist": ["shipment", "processed", "in", "transit", "hold", "delivered", "pending"],
+        "google_fonts": GOOGLE_FONTS_URL,
+    },
+}
+CSS_PURGE_SCRIPTS = ["js/main.js", "js/tracking_map.js"]
+# Glob patterns of classes only third-party scripts (Bootstrap, AOS, GLightbox, Swiper) add at runtime
+CSS_PURGE_SAFELIST = [
+    "show", "showing", "hiding", "collapsing", "fade", "active", "disabled",
+    "modal*", "offcanvas*", "dropdown*", "tooltip*", "popover*", "carousel-item-*",
+    "aos-*", "glightbox*", "gslide*", "gcontainer", "ginner-container", "gnext", "gprev",
+    "gclose", "gdesc*", "gbtn", "gfade*", "gzoom*", "gloader", "goverlay", "swiper*",
+]
+
 STATICFILES_DIRS = [
     BASE_DIR / "static",
+    *([RESPONSIVE_IMAGE_ROOT] if RESPONSIVE_IMAGE_ROOT.exists() else []),
 ]
 
+# Generated receipt PDFs are kept in the default storage under this prefix
+RECEIPT_STORAGE_DIR = 'receipts'
+# Processes export_receipts renders the ZIP export on; the admin action always renders in-process
+RECEIPT_EXPORT_WORKERS = int(os.getenv('RECEIPT_EXPORT_WORKERS', min(4, os.cpu_count() or 1)))
+
 #CKEDITOR_BASEPATH = "/static/ckeditor/ckeditor/"
 
 X_FRAME_OPTIONS ='SAMEORIGIN'
@@ -208,6 +295,30 @@ JAZZMIN_SETTINGS = {
     # Add more customization as needed
 }
 
+# Geocoding cache (seconds / entries)
+GEOCODE_CACHE_TTL = int(os.getenv('GEOCODE_CACHE_TTL', 60 * 60 * 24 * 30))
+GEOCODE_NEGATIVE_CACHE_TTL = int(os.getenv('GEOCODE_NEGATIVE_CACHE_TTL', 60 * 60 * 24))
+GEOCODE_CACHE_MAX_ENTRIES = int(os.getenv('GEOCODE_CACHE_MAX_ENTRIES', 50000))
+GEOCODE_LRU_SIZE = 1024
+# Nominatim client: (connect, read) timeouts in seconds, parallel lookups
+# and the circuit breaker that stops calling it after repeated failures
+GEOCODE_CONNECT_TIMEOUT = 3.05
+GEOCODE_READ_TIMEOUT = 5
+GEOCODE_MAX_CONCURRENCY = 3
+# Nominatim requests per second from each process; its usage policy allows 1 in total,
+# so run the geocoding (backfill_coordinates, background saves) from few processes
+GEOCODE_MAX_RATE = float(os.getenv('GEOCODE_MAX_RATE', 1))
+GEOCODE_USER_AGENT = os.getenv('GEOCODE_USER_AGENT', 'ChaselogixTracking/1.0 (+https://chaselogix.com; support@chaselogix.com)')
+GEOCODE_BREAKER_THRESHOLD = 5
+GEOCODE_BREAKER_RESET = 30
+# 'server' renders the route map with plotly in the view, 'client' only sends
+# coordinates and draws it in the browser (static/js/tracking_map.js)
+TRACKING_MAP_MODE = os.getenv('TRACKING_MAP_MODE', 'server')
+# Rendered route map fragments are cached by route for this long (seconds)
+TRACKING_MAP_CACHE_TIMEOUT = 60 * 60 * 24 * 7
+# Geocode package locations on a background thread after save
+GEOCODE_IN_BACKGROUND = True
+
 # Email Configuration
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = os.getenv('EMAIL_HOST', 'smtp.hostinger.com')
@@ -218,6 +329,21 @@ EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD', 'Arinze123.')
 DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL', 'Chaselogix <support@chaselogix.com>')
 EMAIL_TIMEOUT = 30
 
+# Batched sends reuse one SMTP connection and are throttled to this many
+# messages per second (0 disables the limit)
+EMAIL_MAX_RATE = float(os.getenv('EMAIL_MAX_RATE', 5))
+
+# Email outbox (manage.py process_outbox): retries back off from
+# OUTBOX_RETRY_BASE doubling up to OUTBOX_RETRY_MAX seconds, then dead-letter
+OUTBOX_MAX_ATTEMPTS = 6
+OUTBOX_RETRY_BASE = 60
+OUTBOX_RETRY_MAX = 60 * 60
+
+# Log how long the app's modules take to import at startup and whether plotly /
+# reportlab were pulled in (they should only load on first map / receipt render)
+IMPORT_TIMING_REPORT = os.getenv('IMPORT_TIMING_REPORT', 'False') == 'True'
+IMPORT_TIMING_MODULES = ['consignment.views', 'consignment.admin', 'consignment.sitemaps']
+
 # Configure logging for email errors
 LOGGING = {
     'version': 1,
@@ -242,6 +368,10 @@ LOGGING = {
             'level': 'ERROR',
             'propagate': True,
         },
+        'consignment.lazy': {
+            'handlers': ['console'],
+            'level': 'INFO' if IMPORT_TIMING_REPORT else 'WARNING',
+        },
     },
 }
 
@@ -18,11 +18,10 @@ from django.contrib import admin
 from django.urls import path
 from django.urls import include
 from django.contrib.sitemaps.views import sitemap
-from consignment.sitemaps import PackageSitemap, StaticViewSitemap
+from consignment.sitemaps import StaticViewSitemap, package_sitemap, sitemap_index
 
 sitemaps = {
     'static': StaticViewSitemap,
-    'packages': PackageSitemap,
 }
 
 from django.conf import settings
@@ -32,7 +31,10 @@ app = 'consignment'
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('sitemap.xml', sitemap, {'sitemaps': sitemaps},name='django.contrib.sitemaps.views.sitemap'),
+    # Packages are listed in cached shards of 50k URLs behind a sitemap index
+    path('sitemap.xml', sitemap_index, name='sitemap-index'),
+    path('sitemap-static.xml', sitemap, {'sitemaps': sitemaps}, name='sitemap-static'),
+    path('sitemap-packages-<int:shard>.xml', package_sitemap, name='sitemap-packages'),
 
 
     path('', include('consignment.urls')),
@@ -1,5 +1,31 @@
-from django.contrib import admin
-from .models import Package
+from django.contrib import admin, messages
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path
+from django.utils import timezone
+
+from . import receipts
+from .forms import PackageImportForm
+from .importers import import_packages, read_rows, text_stream
+from .models import OutboundEmail, Package, TrackingEvent
+
+
+class TrackingEventInline(admin.TabularInline):
+    """Read-only history; events are appended by saves, never edited"""
+    model = TrackingEvent
+    fields = ('timestamp', 'status', 'location', 'note')
+    readonly_fields = fields
+    ordering = ('-timestamp',)
+    extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
 
 
 class PackageAdmin(admin.ModelAdmin):
@@ -8,6 +34,43 @@ class PackageAdmin(admin.ModelAdmin):
     )
     search_fields = ('package_id', 'package_name', 'tracking_code')
     list_filter = ('package_status', 'mode_of_transit', 'shipping_date')
+    # A filtered page would otherwise also COUNT(*) the whole table for "N total"
+    show_full_result_count = False
+    actions = ['export_receipts_zip', 'send_notifications']
+    change_list_template = 'admin/consignment/package/change_list.html'
+    inlines = [TrackingEventInline]
+
+    def get_urls(self):
+        return [
+            path('import/', self.admin_site.admin_view(self.import_view), name='consignment_package_import'),
+        ] + super().get_urls()
+
+    def import_view(self, request):
+        """Upload a CSV / JSON Lines file and bulk-create the packages in it"""
+        if not self.has_add_permission(request):
+            return redirect('admin:consignment_package_changelist')
+        form = PackageImportForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            upload = form.cleaned_data['file']
+            try:
+                report = import_packages(
+                    read_rows(text_stream(upload.file), form.cleaned_data['format']),
+                    notify=form.cleaned_data['notify'],
+                )
+            except (UnicodeDecodeError, ValueError) as e:
+                self.message_user(request, f'Could not read {upload.name}: {e}', messages.ERROR)
+            else:
+                self.message_user(request, str(report), messages.SUCCESS if not report.failed else messages.WARNING)
+                for line, message in report.errors:
+                    self.message_user(request, f'Row {line}: {message}', messages.ERROR)
+                return redirect('admin:consignment_package_changelist')
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Import packages',
+            'form': form,
+        }
+        return TemplateResponse(request, 'admin/consignment/package/import.html', context)
 
     # Custom display for map iframes in the admin panel
     def map_iframe(self, obj):
@@ -18,5 +81,47 @@ class PackageAdmin(admin.ModelAdmin):
 
     map_iframe.short_description = 'Map Preview'
     map_iframe.allow_tags = True
+
+    @admin.action(description='Queue notification emails')
+    def send_notifications(self, request, queryset):
+        """Hand the emails to the outbox; process_outbox sends them at EMAIL_MAX_RATE, not this request"""
+        packages = queryset.exclude(email__isnull=True).exclude(email='').only('pk', 'email')
+        queued = OutboundEmail.objects.bulk_create([
+            OutboundEmail(package=package, recipient=package.email)
+            for package in packages.iterator(chunk_size=1000)
+        ], batch_size=1000)
+        self.message_user(request, f'Queued {len(queued)} notification emails for delivery.', messages.SUCCESS)
+
+    @admin.action(description='Export receipts as a ZIP of PDFs')
+    def export_receipts_zip(self, request, queryset):
+        # Rendered in-process: a worker pool would fork this server process, threads and all
+        packages = queryset.order_by('pk').iterator(chunk_size=500)
+        if isinstance(request, ASGIRequest):
+            chunks = receipts.astream_receipts_zip(packages)
+        else:
+            chunks = receipts.stream_receipts_zip(packages)
+        response = StreamingHttpResponse(chunks, content_type='application/zip')
+        response['Content-Disposition'] = 'attachment; filename="package_receipts.zip"'
+        return response
     
 admin.site.register(Package, PackageAdmin)
+
+
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ('recipient', 'package', 'kind', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('status', 'kind')
+    search_fields = ('recipient', 'package__package_id', 'package__tracking_code')
+    readonly_fields = ('created_at', 'sent_at', 'last_error', 'leased_until')
+    list_select_related = ('package',)
+    actions = ['retry_now']
+
+    @admin.action(description='Retry selected emails now')
+    def retry_now(self, request, queryset):
+        """Give failed and dead-lettered rows a fresh set of attempts, leaving alone any a worker is sending"""
+        now = timezone.now()
+        retried = queryset.exclude(status=OutboundEmail.SENT).exclude(leased_until__gt=now).update(
+            status=OutboundEmail.PENDING, attempts=0, last_error='', next_attempt_at=now, leased_until=None
+        )
+        self.message_user(request, f'{retried} emails will be retried by the next process_outbox run.', messages.SUCCESS)
+
+admin.site.register(OutboundEmail, OutboundEmailAdmin)
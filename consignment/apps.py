@@ -1,6 +1,20 @@
+import logging
+
 from django.apps import AppConfig
+from django.conf import settings
+
+logger = logging.getLogger('consignment.lazy')
 
 
 class ConsignmentConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'consignment'
+
+    def ready(self):
+        from . import checks  # registers the system checks
+
+        if getattr(settings, 'IMPORT_TIMING_REPORT', False):
+            from .lazy import startup_report
+
+            for line in startup_report(getattr(settings, 'IMPORT_TIMING_MODULES', ['consignment.views'])):
+                logger.info(f'startup import: {line}')
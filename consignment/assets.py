@@ -0,0 +1,359 @@
+import fnmatch
+import hashlib
+import json
+import os
+import re
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.template.loader import get_template
+
+# Bump when the purge / minify rules change so bundles are rebuilt
+BUNDLER_VERSION = 1
+
+MANIFEST_NAME = 'manifest.json'
+
+# Templates mark the end of their above-the-fold markup with this comment
+FOLD_MARKER = '{# fold #}'
+
+# Self-hosted webfonts written by `build_css --fetch-fonts`
+FONTS_CSS = 'css/fonts.css'
+
+# At-rules whose blocks hold further rules, which are purged one by one
+_GROUPING_AT_RULES = ('@media', '@supports', '@layer', '@container', '@document')
+
+_STRING = re.compile(r'''("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')''')
+_CLASS = re.compile(r'\.((?:\\.|[\w-])+)')
+_ID = re.compile(r'#((?:\\.|[\w-])+)')
+# :not(.x) matches more when .x is absent, and :is()/:where() need only one branch
+_LENIENT_PSEUDO = re.compile(r':(?:not|is|where|has)\((?:[^()]|\([^()]*\))*\)')
+_TOKEN = re.compile(r'[\w-]+')
+_BOUNDARY = re.compile(r'''[{;}"']''')
+
+
+def build_dir():
+    return Path(getattr(settings, 'CSS_BUNDLE_ROOT', settings.BASE_DIR / 'static_build'))
+
+
+def output_prefix():
+    return getattr(settings, 'CSS_BUNDLE_PREFIX', 'bundles')
+
+
+def bundles():
+    return getattr(settings, 'CSS_BUNDLES', {})
+
+
+def safelist(config):
+    """Glob patterns of classes the purge can't see: added by third-party scripts or built from data"""
+    return tuple(getattr(settings, 'CSS_PURGE_SAFELIST', ())) + tuple(config.get('safelist', ()))
+
+
+def load_manifest(path=None):
+    path = path or build_dir() / output_prefix() / MANIFEST_NAME
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def source_files(config):
+    """Static names of the bundle's stylesheets, with the self-hosted fonts first when present"""
+    names = list(config['css'])
+    if finders.find(FONTS_CSS):
+        names.insert(0, FONTS_CSS)
+    return names
+
+
+# Parsing
+
+def _read_block(css, start):
+    """Index just past the '}' closing the block whose '{' precedes `start`"""
+    depth, i = 1, start
+    while i < len(css):
+        char = css[i]
+        if char in '"\'':
+            i = _STRING.match(css, i).end()
+            continue
+        if char == '{':
+            depth += 1
+        elif char == '}':
+            depth -= 1
+            if depth == 0:
+                return i + 1
+        i += 1
+    return i
+
+
+def parse(css):
+    """Split a stylesheet into (prelude, body) nodes; grouping at-rules get a list of child nodes"""
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.S)
+    nodes, i = [], 0
+    while i < len(css):
+        match = _BOUNDARY.search(css, i)
+        while match and match.group() in '"\'':
+            match = _BOUNDARY.search(css, _STRING.match(css, match.start()).end())
+        if match is None:
+            break
+        prelude = css[i:match.start()].strip()
+        if match.group() == ';':
+            # @charset is only valid first in a file, so bundles get their own
+            if prelude and not prelude.startswith('@charset'):
+                nodes.append((prelude, None))  # @import
+            i = match.end()
+        elif match.group() == '}':
+            i = match.end()
+        else:
+            end = _read_block(css, match.end())
+            body = css[match.end():end - 1]
+            if prelude.startswith(_GROUPING_AT_RULES):
+                nodes.append((prelude, parse(body)))
+            else:
+                nodes.append((prelude, body))
+            i = end
+    return nodes
+
+
+def _split_selectors(prelude):
+    """Split a selector list on top-level commas"""
+    parts, depth, current = [], 0, ''
+    for char in prelude:
+        if char in '([':
+            depth += 1
+        elif char in ')]':
+            depth -= 1
+        if char == ',' and depth == 0:
+            parts.append(current)
+            current = ''
+        else:
+            current += char
+    return parts + [current]
+
+
+# Purging
+
+def _unescape(name):
+    return re.sub(r'\\(.)', r'\1', name)
+
+
+def _selector_used(selector, tokens, patterns):
+    selector = _LENIENT_PSEUDO.sub('', re.sub(r'\[[^\]]*\]', '', selector))
+    for name in _CLASS.findall(selector):
+        name = _unescape(name)
+        if name not in tokens and not any(fnmatch.fnmatchcase(name, pattern) for pattern in patterns):
+            return False
+    return all(_unescape(name) in tokens for name in _ID.findall(selector))
+
+
+def purge(nodes, tokens, patterns=()):
+    """Drop style rules whose selectors name classes or ids that never appear in `tokens`.
+
+    Classes matching one of the glob `patterns` are always kept.
+    """
+    kept = []
+    for prelude, body in nodes:
+        if isinstance(body, list):
+            children = purge(body, tokens, patterns)
+            if children:
+                kept.append((prelude, children))
+        elif prelude.startswith('@') or body is None:
+            kept.append((prelude, body))
+        else:
+            selectors = [s.strip() for s in _split_selectors(prelude) if _selector_used(s, tokens, patterns)]
+            if selectors and body.strip():
+                kept.append((','.join(selectors), body))
+    return _drop_unused_at_rules(kept)
+
+
+def _walk(nodes):
+    for prelude, body in nodes:
+        if isinstance(body, list):
+            yield from _walk(body)
+        else:
+            yield prelude, body
+
+
+def _drop_unused_at_rules(nodes):
+    """Remove @font-face and @keyframes nobody refers to any more"""
+    text = ' '.join(body for prelude, body in _walk(nodes)
+                    if body and not prelude.startswith(('@font-face', '@keyframes', '@-webkit-keyframes')))
+
+    def used(prelude, body):
+        if prelude.startswith(('@keyframes', '@-webkit-keyframes')):
+            return re.search(rf'(?<![\w-]){re.escape(prelude.split()[-1])}(?![\w-])', text)
+        if prelude.startswith('@font-face'):
+            family = re.search(r'font-family\s*:\s*["\']?([^;"\']+)', body)
+            return not family or family.group(1).strip() in text
+        return True
+
+    kept = []
+    for prelude, body in nodes:
+        if isinstance(body, list):
+            children = [child for child in body if isinstance(child[1], list) or used(*child)]
+            if children:
+                kept.append((prelude, children))
+        elif used(prelude, body):
+            kept.append((prelude, body))
+    return kept
+
+
+# Minifying
+
+def _squeeze(text, punctuation):
+    """Collapse whitespace outside strings and drop it around `punctuation`"""
+    parts = _STRING.split(text)
+    for index in range(0, len(parts), 2):
+        part = re.sub(r'\s+', ' ', parts[index])
+        if punctuation:
+            part = re.sub(rf'\s*([{re.escape(punctuation)}])\s*', r'\1', part)
+        parts[index] = part
+    return ''.join(parts).strip()
+
+
+def serialize(nodes):
+    out = []
+    for prelude, body in nodes:
+        if body is None:
+            out.append(_squeeze(prelude, ',') + ';')
+        elif isinstance(body, list):
+            out.append(_squeeze(prelude, ',') + '{' + serialize(body) + '}')
+        elif prelude.startswith(('@keyframes', '@-webkit-keyframes')):
+            out.append(_squeeze(prelude, '') + '{' + _squeeze(body, '{};:,') + '}')
+        else:
+            # Selector whitespace can be a descendant combinator, so only trim around , > { }
+            out.append(_squeeze(prelude, ',>') + '{' + _squeeze(body, ';:,').rstrip(';') + '}')
+    return ''.join(out)
+
+
+# Building
+
+def template_tokens(template_names, above_fold=False):
+    """Every word in the templates (and their markup up to the fold marker when `above_fold`)"""
+    tokens = set()
+    for name in template_names:
+        text = Path(get_template(name).origin.name).read_text()
+        if above_fold and FOLD_MARKER in text:
+            text = text.split(FOLD_MARKER, 1)[0]
+        tokens.update(_TOKEN.findall(text))
+    return tokens
+
+
+def script_tokens():
+    """Class names our own scripts toggle at runtime"""
+    tokens = set()
+    for name in getattr(settings, 'CSS_PURGE_SCRIPTS', ()):
+        path = finders.find(name)
+        if path:
+            tokens.update(_TOKEN.findall(Path(path).read_text()))
+    return tokens
+
+
+def _read_sources(names):
+    css = []
+    for name in names:
+        path = finders.find(name)
+        if path is None:
+            raise FileNotFoundError(f'Stylesheet {name} not found by the staticfiles finders')
+        text = Path(path).read_text(encoding='utf-8')
+        # Sources live one level down (css/), as do the bundles, so relative url()s still resolve
+        if Path(name).parent != Path('css'):
+            raise ValueError(f'{name}: bundle sources must sit directly under css/')
+        css.append(text)
+    return '\n'.join(css)
+
+
+def build_bundle(name, config, output_dir):
+    sources = source_files(config)
+    css = _read_sources(sources)
+    scripts = script_tokens()
+    full = serialize(purge(parse(css), template_tokens(config['templates']) | scripts, safelist(config)))
+    # Script-added classes only appear after the scripts run, when the full bundle has long arrived
+    critical = serialize(purge(parse(css), template_tokens(config['templates'], above_fold=True)))
+    if not full.isascii():
+        full = '@charset "UTF-8";' + full
+
+    content_hash = hashlib.sha256(full.encode()).hexdigest()[:12]
+    filename = f'{name}.{content_hash}.css'
+    (output_dir / filename).write_text(full)
+    return {
+        'css': f'{output_prefix()}/{filename}',
+        'critical': critical,
+        'self_hosted_fonts': FONTS_CSS in sources,
+        'source_bytes': len(css.encode()),
+        'bytes': len(full.encode()),
+        'critical_bytes': len(critical.encode()),
+        'fingerprint': _fingerprint(config, sources),
+    }
+
+
+def _fingerprint(config, sources):
+    digest = hashlib.sha256(json.dumps([BUNDLER_VERSION, config, safelist(config)], sort_keys=True).encode())
+    files = [finders.find(name) for name in list(sources) + list(getattr(settings, 'CSS_PURGE_SCRIPTS', ()))]
+    files += [get_template(name).origin.name for name in config['templates']]
+    for path in files:
+        if path:
+            digest.update(Path(path).read_bytes())
+    return digest.hexdigest()
+
+
+def build_bundles(force=False):
+    """Purge, concatenate and minify each configured bundle whose inputs changed; returns (built, skipped)"""
+    output_dir = build_dir() / output_prefix()
+    output_dir.mkdir(parents=True, exist_ok=True)
+    manifest_path = output_dir / MANIFEST_NAME
+    old = load_manifest(manifest_path)
+    manifest, built, skipped = {}, [], []
+    for name, config in bundles().items():
+        entry = old.get(name)
+        if (not force and entry and entry['fingerprint'] == _fingerprint(config, source_files(config))
+                and (build_dir() / entry['css']).exists()):
+            manifest[name] = entry
+            skipped.append(name)
+            continue
+        manifest[name] = build_bundle(name, config, output_dir)
+        built.append(name)
+
+    keep = {Path(entry['css']).name for entry in manifest.values()}
+    for stale in output_dir.iterdir():
+        if stale.name != MANIFEST_NAME and stale.name not in keep:
+            stale.unlink()
+    tmp_path = manifest_path.with_suffix('.tmp')
+    tmp_path.write_text(json.dumps(manifest, indent=1, sort_keys=True))
+    os.replace(tmp_path, manifest_path)
+    return built, skipped
+
+
+def fetch_google_fonts(url, subsets=('latin',)):
+    """Download the woff2 files of a Google Fonts stylesheet into static/fonts and write css/fonts.css.
+
+    Only the @font-face blocks of the wanted unicode subsets are kept, so
+    browsers never see (or fetch) the Cyrillic, Greek or Vietnamese files.
+    """
+    import requests
+
+    static_root = Path(settings.BASE_DIR) / 'static'
+    font_dir = static_root / 'fonts' / 'google'
+    font_dir.mkdir(parents=True, exist_ok=True)
+    # Google serves woff2 with unicode-range subsets only to browsers that support them
+    user_agent = ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+                  '(KHTML, like Gecko) Chrome/120.0 Safari/537.36')
+    css = requests.get(url, headers={'User-Agent': user_agent}, timeout=30).text
+
+    faces = []
+    for subset, block in re.findall(r'/\*\s*([\w-]+)\s*\*/\s*(@font-face\s*{[^}]*})', css):
+        if subset not in subsets:
+            continue
+        font_url = re.search(r'url\((https://[^)]+)\)', block).group(1)
+        family = re.search(r"font-family:\s*'([^']+)'", block).group(1)
+        weight = re.search(r'font-weight:\s*(\d+)', block).group(1)
+        style = re.search(r'font-style:\s*(\w+)', block).group(1)
+        filename = f'{family.lower().replace(" ", "-")}-{weight}-{style}-{subset}.woff2'
+        (font_dir / filename).write_bytes(requests.get(font_url, timeout=30).content)
+        faces.append(block.replace(font_url, f'../fonts/google/{filename}'))
+
+    (static_root / FONTS_CSS).write_text(
+        f'/* Self-hosted from {url} by `manage.py build_css --fetch-fonts` ({", ".join(subsets)} only) */\n'
+        + '\n'.join(faces) + '\n'
+    )
+    return len(faces)
@@ -0,0 +1,16 @@
+from django.core import checks
+
+from .lookup import cache_is_shared
+
+
+@checks.register(checks.Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    """Tracking lookups and rate limits are only correct across workers with a shared cache"""
+    if cache_is_shared():
+        return []
+    return [checks.Warning(
+        'The default cache is local to each process.',
+        hint='Tracking code lookups skip it and query the database every time, and each worker '
+             'rate-limits on its own. Point CACHE_BACKEND/CACHE_LOCATION at a cache all workers share.',
+        id='consignment.W001',
+    )]
@@ -1,5 +1,14 @@
 from django import forms
-from .models import Package, Customer
+from .models import Package
 
 class TrackingCodeForm(forms.Form):
-    tracking_code = forms.CharField(max_length=50, label='Tracking Code')
\ No newline at end of file
+    tracking_code = forms.CharField(max_length=50, label='Tracking Code')
+
+class PackageImportForm(forms.Form):
+    FORMAT_CHOICES = [
+        ('csv', 'CSV'),
+        ('jsonl', 'JSON Lines'),
+    ]
+    file = forms.FileField(help_text='One package per row/line, with Package field names as columns')
+    format = forms.ChoiceField(choices=FORMAT_CHOICES)
+    notify = forms.BooleanField(required=False, initial=True, label='Queue notification emails')
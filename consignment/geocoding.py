@@ -0,0 +1,553 @@
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import httpx
+import requests
+import requests.adapters
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+NOMINATIM_URL = 'https://nominatim.openstreetmap.org/search'
+# Nominatim's usage policy asks for an application-identifying User-Agent
+USER_AGENT = 'ChaselogixTracking/1.0 (+https://chaselogix.com; support@chaselogix.com)'
+
+# Marker stored for addresses Nominatim has no result for
+NOT_FOUND = (None, None)
+
+
+def normalize_address(address):
+    """Collapse whitespace and case so equivalent addresses share a cache entry"""
+    return ' '.join((address or '').split()).casefold()
+
+
+def address_key(address):
+    return hashlib.sha1(normalize_address(address).encode('utf-8')).hexdigest()
+
+
+class LRUCache:
+    """Small thread-safe in-process LRU with per-entry expiry"""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+_memory_cache = LRUCache(_setting('GEOCODE_LRU_SIZE', 1024))
+# Stores since the last prune, counted across every thread of the process
+_writes_since_prune = 0
+_prune_lock = threading.Lock()
+
+
+def _ttl(found):
+    if found:
+        return _setting('GEOCODE_CACHE_TTL', 60 * 60 * 24 * 30)
+    return _setting('GEOCODE_NEGATIVE_CACHE_TTL', 60 * 60 * 24)
+
+
+def _remember(key, coords):
+    _memory_cache.set(key, coords, _ttl(coords != NOT_FOUND))
+
+
+def _load_from_db(key):
+    from .models import GeocodeCacheEntry
+
+    now = timezone.now()
+    entry = GeocodeCacheEntry.objects.filter(address_key=key, expires_at__gt=now).first()
+    if entry is None:
+        return None
+    GeocodeCacheEntry.objects.filter(pk=entry.pk).update(last_used_at=now)
+    return entry.coordinates
+
+
+async def _aload_from_db(key):
+    from .models import GeocodeCacheEntry
+
+    now = timezone.now()
+    entry = await GeocodeCacheEntry.objects.filter(address_key=key, expires_at__gt=now).afirst()
+    if entry is None:
+        return None
+    await GeocodeCacheEntry.objects.filter(pk=entry.pk).aupdate(last_used_at=now)
+    return entry.coordinates
+
+
+def _entry_defaults(address, coords):
+    now = timezone.now()
+    found = coords != NOT_FOUND
+    return {
+        'address': normalize_address(address),
+        'latitude': coords[0],
+        'longitude': coords[1],
+        'found': found,
+        'expires_at': now + timedelta(seconds=_ttl(found)),
+        'last_used_at': now,
+    }
+
+
+def _prune_due():
+    global _writes_since_prune
+    with _prune_lock:
+        _writes_since_prune += 1
+        if _writes_since_prune >= _setting('GEOCODE_CACHE_PRUNE_EVERY', 100):
+            _writes_since_prune = 0
+            return True
+        return False
+
+
+def _store_in_db(key, address, coords):
+    from .models import GeocodeCacheEntry
+
+    GeocodeCacheEntry.objects.update_or_create(address_key=key, defaults=_entry_defaults(address, coords))
+    if _prune_due():
+        prune_cache()
+
+
+async def _astore_in_db(key, address, coords):
+    from .models import GeocodeCacheEntry
+
+    await GeocodeCacheEntry.objects.aupdate_or_create(address_key=key, defaults=_entry_defaults(address, coords))
+    if _prune_due():
+        await sync_to_async(prune_cache)()
+
+
+def prune_cache():
+    """Drop expired rows, then the least recently used ones above the size bound"""
+    from .models import GeocodeCacheEntry
+
+    deleted, _ = GeocodeCacheEntry.objects.filter(expires_at__lte=timezone.now()).delete()
+    max_entries = _setting('GEOCODE_CACHE_MAX_ENTRIES', 50000)
+    overflow = GeocodeCacheEntry.objects.count() - max_entries
+    if overflow > 0:
+        stale = GeocodeCacheEntry.objects.order_by('last_used_at').values_list('pk', flat=True)[:overflow]
+        evicted, _ = GeocodeCacheEntry.objects.filter(pk__in=list(stale)).delete()
+        deleted += evicted
+    return deleted
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling Nominatim while the circuit breaker is open"""
+
+
+class CircuitBreaker:
+    """Stop calling an upstream after repeated failures, retrying after a cool-down.
+
+    After `failure_threshold` consecutive failures the breaker opens and every
+    call fails fast for `reset_timeout` seconds. The first call after that is
+    let through (half-open); success closes the breaker, failure reopens it.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        with self._lock:
+            return self._opened_at is not None and time.monotonic() - self._opened_at < self.reset_timeout
+
+    def before_call(self):
+        with self._lock:
+            if self._opened_at is None:
+                return
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                raise CircuitOpenError('Geocoding temporarily disabled after repeated failures')
+            # Half-open: let this call through, and fail fast for the others
+            self._opened_at = time.monotonic()
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._failures >= self.failure_threshold:
+                if self._opened_at is None:
+                    logger.warning(f"Geocoding circuit opened after {self._failures} failures")
+                self._opened_at = time.monotonic()
+
+
+class RateLimiter:
+    """Spaces calls at least 1/`rate` seconds apart across every thread and event loop of the process.
+
+    Each caller reserves the next free slot and waits for it, so a burst of
+    lookups is paced out instead of hitting the upstream at once. A rate of
+    0 disables the limit.
+    """
+
+    def __init__(self, rate=1):
+        self.interval = 1 / rate if rate else 0
+        self._next_slot = 0
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """Claim the next slot; returns how many seconds to wait before using it"""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+            return slot - now
+
+
+class GeocodingClient:
+    """Nominatim client with a keep-alive connection pool, strict timeouts, a rate limit and a circuit breaker"""
+
+    def __init__(self, url=NOMINATIM_URL, connect_timeout=3.05, read_timeout=5,
+                 pool_size=4, max_concurrency=3, breaker=None, rate_limiter=None, user_agent=USER_AGENT):
+        self.url = url
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_concurrency = max_concurrency
+        self.breaker = breaker or CircuitBreaker()
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.session = requests.Session()
+        self.session.headers['User-Agent'] = user_agent
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='nominatim')
+
+    def fetch(self, address):
+        self.breaker.before_call()
+        time.sleep(self.rate_limiter.reserve())
+        try:
+            response = self.session.get(self.url, params={'q': address, 'format': 'json'}, timeout=self.timeout)
+            response.raise_for_status()
+            data = response.json()
+        except (requests.RequestException, ValueError):
+            self.breaker.record_failure()
+            raise
+        self.breaker.record_success()
+        if data:
+            return float(data[0]['lat']), float(data[0]['lon'])
+        return NOT_FOUND
+
+    def fetch_many(self, addresses):
+        """Fetch several addresses at once; the result maps each address to coords or an exception"""
+        futures = {address: self._executor.submit(self.fetch, address) for address in addresses}
+        results = {}
+        for address, future in futures.items():
+            try:
+                results[address] = future.result()
+            except Exception as e:
+                results[address] = e
+        return results
+
+
+class AsyncGeocodingClient:
+    """httpx counterpart of GeocodingClient for async views, sharing its circuit breaker and rate limit.
+
+    Lookups are awaited on the event loop instead of holding a thread each,
+    so one worker can wait on many of them at once.
+    """
+
+    def __init__(self, url=NOMINATIM_URL, connect_timeout=3.05, read_timeout=5,
+                 pool_size=4, max_concurrency=3, breaker=None, rate_limiter=None, user_agent=USER_AGENT):
+        self.url = url
+        self.breaker = breaker or CircuitBreaker()
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.client = httpx.AsyncClient(
+            headers={'User-Agent': user_agent},
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+        )
+        # Nominatim's usage policy still applies, however many requests are waiting
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def fetch(self, address):
+        self.breaker.before_call()
+        try:
+            async with self._semaphore:
+                await asyncio.sleep(self.rate_limiter.reserve())
+                response = await self.client.get(self.url, params={'q': address, 'format': 'json'})
+            response.raise_for_status()
+            data = response.json()
+        except (httpx.HTTPError, ValueError):
+            self.breaker.record_failure()
+            raise
+        self.breaker.record_success()
+        if data:
+            return float(data[0]['lat']), float(data[0]['lon'])
+        return NOT_FOUND
+
+    async def fetch_many(self, addresses):
+        """Fetch several addresses at once; the result maps each address to coords or an exception"""
+        fetched = await asyncio.gather(*(self.fetch(address) for address in addresses), return_exceptions=True)
+        return dict(zip(addresses, fetched))
+
+
+_client = None
+_client_lock = threading.Lock()
+# httpx clients can't be shared between event loops, so there is one per loop
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_client():
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = GeocodingClient(
+                connect_timeout=_setting('GEOCODE_CONNECT_TIMEOUT', 3.05),
+                read_timeout=_setting('GEOCODE_READ_TIMEOUT', 5),
+                max_concurrency=_setting('GEOCODE_MAX_CONCURRENCY', 3),
+                breaker=CircuitBreaker(
+                    failure_threshold=_setting('GEOCODE_BREAKER_THRESHOLD', 5),
+                    reset_timeout=_setting('GEOCODE_BREAKER_RESET', 30),
+                ),
+                rate_limiter=RateLimiter(_setting('GEOCODE_MAX_RATE', 1)),
+                user_agent=_setting('GEOCODE_USER_AGENT', USER_AGENT),
+            )
+        return _client
+
+
+def get_async_client():
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = _async_clients[loop] = AsyncGeocodingClient(
+            connect_timeout=_setting('GEOCODE_CONNECT_TIMEOUT', 3.05),
+            read_timeout=_setting('GEOCODE_READ_TIMEOUT', 5),
+            max_concurrency=_setting('GEOCODE_MAX_CONCURRENCY', 3),
+            # One breaker and one rate limit for the whole process, whichever client calls
+            breaker=get_client().breaker,
+            rate_limiter=get_client().rate_limiter,
+            user_agent=_setting('GEOCODE_USER_AGENT', USER_AGENT),
+        )
+    return client
+
+
+def fetch_coordinates(address):
+    """Query Nominatim directly, bypassing every cache level"""
+    return get_client().fetch(address)
+
+
+def _cached(address):
+    key = address_key(address)
+    coords = _memory_cache.get(key)
+    if coords is not None:
+        return coords
+    try:
+        coords = _load_from_db(key)
+    except DatabaseError as e:
+        logger.error(f"Geocode cache read failed for {address!r}: {e}")
+        return None
+    if coords is not None:
+        _remember(key, coords)
+    return coords
+
+
+def _save(address, coords):
+    key = address_key(address)
+    _remember(key, coords)
+    try:
+        _store_in_db(key, address, coords)
+    except DatabaseError as e:
+        logger.error(f"Geocode cache write failed for {address!r}: {e}")
+
+
+async def _acached(address):
+    key = address_key(address)
+    coords = _memory_cache.get(key)
+    if coords is not None:
+        return coords
+    try:
+        coords = await _aload_from_db(key)
+    except DatabaseError as e:
+        logger.error(f"Geocode cache read failed for {address!r}: {e}")
+        return None
+    if coords is not None:
+        _remember(key, coords)
+    return coords
+
+
+async def _asave(address, coords):
+    key = address_key(address)
+    _remember(key, coords)
+    try:
+        await _astore_in_db(key, address, coords)
+    except DatabaseError as e:
+        logger.error(f"Geocode cache write failed for {address!r}: {e}")
+
+
+def _failed(address, error):
+    if not isinstance(error, CircuitOpenError):
+        logger.error(f"Geocoding failed for {address!r}: {error}")
+    return NOT_FOUND
+
+
+def geocode_many(addresses):
+    """Geocode several addresses, fetching every cache miss concurrently.
+
+    Returns a dict mapping each address to (lat, lon), or (None, None) when it
+    can't be found or Nominatim is unavailable. Lookups go through an
+    in-process LRU, then the GeocodeCacheEntry table, and only reach Nominatim
+    on a miss in both. "Not found" answers are cached for a shorter TTL;
+    network errors and an open circuit breaker are never cached.
+    """
+    results = {}
+    misses = []
+    for address in dict.fromkeys(addresses):
+        if not normalize_address(address):
+            results[address] = NOT_FOUND
+            continue
+        coords = _cached(address)
+        if coords is None:
+            misses.append(address)
+        else:
+            results[address] = coords
+
+    if misses:
+        client = get_client()
+        if client.breaker.is_open:
+            fetched = {address: CircuitOpenError() for address in misses}
+        else:
+            fetched = client.fetch_many(misses)
+        for address, coords in fetched.items():
+            if isinstance(coords, Exception):
+                results[address] = _failed(address, coords)
+            else:
+                _save(address, coords)
+                results[address] = coords
+    return results
+
+
+async def ageocode_many(addresses):
+    """geocode_many for async views: the same cache levels, with every query awaited"""
+    results = {}
+    misses = []
+    for address in dict.fromkeys(addresses):
+        if not normalize_address(address):
+            results[address] = NOT_FOUND
+            continue
+        coords = await _acached(address)
+        if coords is None:
+            misses.append(address)
+        else:
+            results[address] = coords
+
+    if misses:
+        client = get_async_client()
+        if client.breaker.is_open:
+            fetched = {address: CircuitOpenError() for address in misses}
+        else:
+            fetched = await client.fetch_many(misses)
+        for address, coords in fetched.items():
+            if isinstance(coords, Exception):
+                results[address] = _failed(address, coords)
+            else:
+                await _asave(address, coords)
+                results[address] = coords
+    return results
+
+
+def geocode(address):
+    """Return (lat, lon) for an address, or (None, None) when it can't be found"""
+    return geocode_many([address])[address]
+
+
+_background = ThreadPoolExecutor(max_workers=2, thread_name_prefix='geocode')
+
+
+def geocode_package(package_id):
+    """Fill in coordinates for every location of a package that lacks them"""
+    from .models import Package
+
+    package = Package.objects.filter(pk=package_id).first()
+    if package is None:
+        return {}
+
+    updates = {}
+    missing = package.missing_coordinates()
+    resolved = geocode_many([getattr(package, field) for field in missing])
+    for field in missing:
+        lat, lon = resolved[getattr(package, field)]
+        if lat is not None:
+            lat_field, lon_field = Package.LOCATION_FIELDS[field]
+            updates[lat_field], updates[lon_field] = lat, lon
+
+    if updates:
+        # Only touch rows whose addresses are still the ones we geocoded
+        unchanged = {field: getattr(package, field) for field in Package.LOCATION_FIELDS}
+        # The page shows the route map, and a new updated_at retires its cached copy
+        Package.objects.filter(pk=package_id, **unchanged).update(**updates, updated_at=timezone.now())
+    return updates
+
+
+def _geocode_package_in_background(package_id):
+    close_old_connections()
+    try:
+        geocode_package(package_id)
+    except Exception as e:
+        logger.error(f"Background geocoding failed for package pk={package_id}: {e}")
+    finally:
+        close_old_connections()
+
+
+def schedule_package_geocoding(package_id):
+    """Geocode a package after the current transaction commits.
+
+    Runs on a small thread pool by default so the admin request that saved the
+    package never waits on Nominatim; set GEOCODE_IN_BACKGROUND = False to run
+    it inline (management commands, tests).
+    """
+    if _setting('GEOCODE_IN_BACKGROUND', True):
+        transaction.on_commit(lambda: _background.submit(_geocode_package_in_background, package_id))
+    else:
+        transaction.on_commit(lambda: geocode_package(package_id))
+
+
+def _geocode_packages_in_background(package_ids):
+    for package_id in package_ids:
+        _geocode_package_in_background(package_id)
+
+
+def schedule_bulk_geocoding(package_ids):
+    """Geocode many packages in one background job after the current transaction commits"""
+    package_ids = list(package_ids)
+    if not package_ids:
+        return
+    if _setting('GEOCODE_IN_BACKGROUND', True):
+        transaction.on_commit(lambda: _background.submit(_geocode_packages_in_background, package_ids))
+    else:
+        transaction.on_commit(lambda: [geocode_package(package_id) for package_id in package_ids])
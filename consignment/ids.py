@@ -0,0 +1,117 @@
+import collections
+import threading
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+
+TRACKING_PREFIX = 'CE'
+TRACKING_DIGITS = 13  # plus one check digit
+PACKAGE_PREFIX = 'EXP_'
+PACKAGE_DIGITS = 10  # plus one check digit
+
+# Multipliers coprime with 10, so n -> (n * m + offset) % 10**digits is a
+# bijection: sequential numbers map to distinct, non-sequential codes
+_SCRAMBLE = {
+    TRACKING_DIGITS: (7_919_434_817_317, 1_234_567_890_123),
+    PACKAGE_DIGITS: (7_330_818_449, 4_811_223_097),
+}
+
+
+def luhn_digit(digits):
+    """Check digit that makes `digits` + digit pass the Luhn test"""
+    total = 0
+    for i, char in enumerate(reversed(digits)):
+        value = int(char)
+        if i % 2 == 0:
+            value *= 2
+            if value > 9:
+                value -= 9
+        total += value
+    return str((10 - total % 10) % 10)
+
+
+def luhn_valid(digits):
+    return digits.isdigit() and luhn_digit(digits[:-1]) == digits[-1]
+
+
+def encode(value, digits):
+    multiplier, offset = _SCRAMBLE[digits]
+    body = f'{(value * multiplier + offset) % 10 ** digits:0{digits}d}'
+    return body + luhn_digit(body)
+
+
+def sequence_name(name):
+    return f'consignment_{name}_seq'
+
+
+def reserve_values(name, count):
+    """Take `count` unused values from the named sequence in a single query.
+
+    On PostgreSQL this draws from a real sequence, which never hands a value
+    out twice even if the surrounding transaction rolls back. Other backends
+    (SQLite in development) reserve a consecutive block from an IdSequence row.
+    """
+    from .models import IdSequence
+
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT nextval(%s) FROM generate_series(1, %s)', [sequence_name(name), count])
+            return [row[0] for row in cursor.fetchall()]
+
+    for _ in range(2):
+        with transaction.atomic():
+            # The UPDATE locks the row until commit, so a concurrent reservation
+            # waits and then gets the following block
+            if IdSequence.objects.filter(name=name).update(next_value=F('next_value') + count):
+                end = IdSequence.objects.get(name=name).next_value
+                return list(range(end - count, end))
+        try:
+            with transaction.atomic():
+                IdSequence.objects.create(name=name, next_value=1)
+        except IntegrityError:
+            pass  # created by a concurrent reservation
+    raise RuntimeError(f'Could not reserve ids from sequence {name!r}')
+
+
+class IdAllocator:
+    """Hands out codes from blocks of a database sequence reserved in advance.
+
+    Every process reserves `block_size` values at a time with one query, so
+    allocating an ID costs no query at all until the block runs out, and two
+    processes can never receive the same value.
+    """
+
+    def __init__(self, name, prefix, digits, block_size=None):
+        self.name = name
+        self.prefix = prefix
+        self.digits = digits
+        self.block_size = block_size
+        self._reserved = collections.deque()
+        self._lock = threading.Lock()
+
+    def _block_size(self):
+        return self.block_size or getattr(settings, 'ID_BLOCK_SIZE', 1000)
+
+    def allocate_many(self, count):
+        with self._lock:
+            if len(self._reserved) < count:
+                self._reserved.extend(reserve_values(self.name, max(self._block_size(), count - len(self._reserved))))
+            values = [self._reserved.popleft() for _ in range(count)]
+        return [f'{self.prefix}{encode(value, self.digits)}' for value in values]
+
+    def allocate(self):
+        return self.allocate_many(1)[0]
+
+    def is_valid(self, code):
+        body = code[len(self.prefix):]
+        return code.startswith(self.prefix) and len(body) == self.digits + 1 and luhn_valid(body)
+
+    def reset(self):
+        """Forget the reserved values (after a fork, or when tests flush the table)"""
+        with self._lock:
+            self._reserved.clear()
+
+
+tracking_codes = IdAllocator('tracking_code', TRACKING_PREFIX, TRACKING_DIGITS)
+package_ids = IdAllocator('package_id', PACKAGE_PREFIX, PACKAGE_DIGITS)
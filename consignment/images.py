@@ -0,0 +1,163 @@
+import hashlib
+import io
+import json
+import logging
+import os
+from pathlib import Path
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Bump when the encoder settings below change so every variant is rebuilt
+PIPELINE_VERSION = 1
+
+RASTER_EXTENSIONS = {'.jpg', '.jpeg', '.png'}
+
+# Pillow save options per output format
+ENCODERS = {
+    'avif': {'format': 'AVIF', 'quality': 55, 'speed': 6},
+    'webp': {'format': 'WEBP', 'quality': 78, 'method': 6},
+    'jpg': {'format': 'JPEG', 'quality': 80, 'optimize': True, 'progressive': True},
+    'png': {'format': 'PNG', 'optimize': True},
+}
+
+MIME_TYPES = {'avif': 'image/avif', 'webp': 'image/webp', 'jpg': 'image/jpeg', 'png': 'image/png'}
+
+MANIFEST_NAME = 'manifest.json'
+
+
+def source_dir():
+    return Path(getattr(settings, 'RESPONSIVE_IMAGE_SOURCE', settings.BASE_DIR / 'static' / 'images'))
+
+
+def build_dir():
+    return Path(getattr(settings, 'RESPONSIVE_IMAGE_ROOT', settings.BASE_DIR / 'static_build'))
+
+
+def output_prefix():
+    """Static path the variants are served under, e.g. responsive/about-480w.1a2b3c4d.webp"""
+    return getattr(settings, 'RESPONSIVE_IMAGE_PREFIX', 'responsive')
+
+
+def widths():
+    return tuple(getattr(settings, 'RESPONSIVE_IMAGE_WIDTHS', (480, 960, 1600)))
+
+
+def available_formats():
+    """Modern formats this Pillow build can encode, best first"""
+    from PIL import features
+
+    return [fmt for fmt in ('avif', 'webp') if features.check(fmt)]
+
+
+def _fingerprint(data):
+    """Hash of the source bytes and everything that shapes its variants"""
+    digest = hashlib.sha256(data)
+    digest.update(json.dumps([PIPELINE_VERSION, widths(), available_formats(), ENCODERS]).encode())
+    return digest.hexdigest()
+
+
+def load_manifest(path=None):
+    path = path or build_dir() / output_prefix() / MANIFEST_NAME
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def _encode(image, fmt):
+    if fmt == 'jpg' and image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    buffer = io.BytesIO()
+    image.save(buffer, **ENCODERS[fmt])
+    return buffer.getvalue()
+
+
+def build_variants(image_path, name, output_dir):
+    """Write every width x format of one source image; returns its manifest entry"""
+    from PIL import Image, ImageOps
+
+    data = image_path.read_bytes()
+    with Image.open(image_path) as opened:
+        # Apply EXIF rotation before dropping the metadata
+        source = ImageOps.exif_transpose(opened)
+        source.load()
+    fallback = 'png' if image_path.suffix.lower() == '.png' else 'jpg'
+    # Never upscale, and never ship more pixels than the widest configured slot
+    sizes = sorted({w for w in widths() if w < source.width} | {min(source.width, max(widths()))})
+
+    variants = {}
+    stem = Path(name).with_suffix('').as_posix().replace('/', '-')
+    for width in sizes:
+        height = round(source.height * width / source.width)
+        resized = source if width == source.width else source.resize((width, height), Image.LANCZOS)
+        for fmt in available_formats() + [fallback]:
+            encoded = _encode(resized, fmt)
+            content_hash = hashlib.sha256(encoded).hexdigest()[:12]
+            filename = f'{stem}-{width}w.{content_hash}.{fmt}'
+            (output_dir / filename).write_bytes(encoded)
+            variants.setdefault(fmt, []).append([width, f'{output_prefix()}/{filename}', len(encoded)])
+    return {
+        'fingerprint': _fingerprint(data),
+        'width': sizes[-1],
+        'height': round(source.height * sizes[-1] / source.width),
+        'fallback': fallback,
+        'bytes': len(data),
+        'variants': variants,
+    }
+
+
+def build_images(force=False):
+    """Rebuild variants for new or changed images under the source dir.
+
+    Unchanged sources (same bytes, same pipeline settings, files still on
+    disk) are skipped. Variants of removed or changed sources are deleted.
+    Returns (built, skipped) image names.
+    """
+    output_dir = build_dir() / output_prefix()
+    output_dir.mkdir(parents=True, exist_ok=True)
+    manifest_path = output_dir / MANIFEST_NAME
+    old = load_manifest(manifest_path)
+    manifest, built, skipped = {}, [], []
+
+    root = source_dir()
+    static_root = root.parent
+    for image_path in sorted(root.rglob('*')):
+        if image_path.suffix.lower() not in RASTER_EXTENSIONS:
+            continue
+        # Keys are the static names templates already use, e.g. images/about.jpg
+        name = image_path.relative_to(static_root).as_posix()
+        entry = old.get(name)
+        if (not force and entry and entry['fingerprint'] == _fingerprint(image_path.read_bytes())
+                and all((build_dir() / path).exists() for _, path, _ in _all_variants(entry))):
+            manifest[name] = entry
+            skipped.append(name)
+            continue
+        manifest[name] = build_variants(image_path, name, output_dir)
+        built.append(name)
+        logger.info(f"Built {sum(len(v) for v in manifest[name]['variants'].values())} variants of {name}")
+
+    # Drop files no current manifest entry points at
+    keep = {Path(path).name for entry in manifest.values() for _, path, _ in _all_variants(entry)}
+    for stale in output_dir.iterdir():
+        if stale.name != MANIFEST_NAME and stale.name not in keep:
+            stale.unlink()
+
+    tmp_path = manifest_path.with_suffix('.tmp')
+    tmp_path.write_text(json.dumps(manifest, indent=1, sort_keys=True))
+    os.replace(tmp_path, manifest_path)
+    return built, skipped
+
+
+def _all_variants(entry):
+    for variants in entry['variants'].values():
+        yield from variants
+
+
+def variant_bytes(entry, width):
+    """Bytes a browser with AVIF/WebP support fetches for a slot `width` px wide"""
+    fmt = next(fmt for fmt in ('avif', 'webp', entry['fallback']) if fmt in entry['variants'])
+    candidates = entry['variants'][fmt]
+    return next((length for size, _, length in candidates if size >= width), candidates[-1][2])
@@ -0,0 +1,174 @@
+import csv
+import io
+import itertools
+import json
+import logging
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from .ids import package_ids, tracking_codes
+from .lookup import forget_codes
+from .models import OutboundEmail, Package, TrackingEvent
+
+logger = logging.getLogger(__name__)
+
+# Columns accepted from an import file; anything else is ignored
+IMPORT_FIELDS = (
+    'tracking_code', 'package_id', 'package_name', 'sender', 'receiver', 'tel', 'email',
+    'sending_location', 'receiving_location', 'current_location', 'package_description',
+    'mode_of_transit', 'package_status', 'delivery_update', 'package_weight', 'package_quantity',
+    'shipping_date', 'delivery_date',
+)
+
+# Keep at most this many row errors in the report
+MAX_REPORTED_ERRORS = 100
+
+
+class RowError(ValueError):
+    """A line that couldn't be read as a record; it is reported, and the rest of the file still imported"""
+
+
+def read_rows(stream, fmt):
+    """Yield (line number, dict) for each record of a CSV or JSON Lines text stream.
+
+    A JSON line that doesn't parse, or isn't an object, is yielded as a
+    RowError in place of the dict.
+    """
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for record in reader:
+            # line_num counts physical lines read so far, header included
+            yield reader.line_num, record
+    elif fmt == 'jsonl':
+        for number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield number, RowError(f'invalid JSON: {e}')
+                continue
+            if not isinstance(record, dict):
+                yield number, RowError(f'expected a JSON object, got {type(record).__name__}')
+                continue
+            yield number, record
+    else:
+        raise ValueError(f'Unsupported import format: {fmt}')
+
+
+def text_stream(binary_file):
+    """Decode an uploaded or opened binary file lazily, tolerating a UTF-8 BOM"""
+    return io.TextIOWrapper(binary_file, encoding='utf-8-sig', newline='')
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(itertools.islice(iterator, size)):
+        yield chunk
+
+
+class ImportReport:
+    def __init__(self):
+        self.rows = 0
+        self.created = 0
+        self.failed = 0
+        self.errors = []
+
+    def add_error(self, line, message):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+    def __str__(self):
+        return f'{self.created} of {self.rows} rows imported, {self.failed} rejected'
+
+
+def _build(record):
+    values = {field: record[field] for field in IMPORT_FIELDS if record.get(field) not in (None, '')}
+    package = Package(**{
+        # Placeholders keep the model defaults from allocating IDs one at a time
+        'tracking_code': '', 'package_id': '', **values,
+    })
+    package._given_ids = {field: field in values for field in ('tracking_code', 'package_id')}
+    # Supplied IDs are validated like any other field; only the placeholders are skipped
+    package.full_clean(exclude=[field for field, given in package._given_ids.items() if not given],
+                       validate_unique=False)
+    return package
+
+
+def import_packages(rows, batch_size=1000, notify=True, dry_run=False):
+    """Validate and insert packages from (line number, dict) pairs, `batch_size` rows at a time.
+
+    Rows are checked against the Package field constraints; tracking codes and
+    package IDs are allocated in bulk for rows that don't bring their own, and
+    uniqueness is checked with one query per batch. Valid rows are inserted
+    with bulk_create, and their first tracking events and notification emails
+    are written in the same transaction. bulk_create skips post_save, so nothing is sent
+    or geocoded inline; run backfill_coordinates afterwards. Rows that fail,
+    including RowErrors from read_rows, are reported by line number.
+    """
+    report = ImportReport()
+    for chunk in chunked(rows, batch_size):
+        candidates = []
+        for line, record in chunk:
+            report.rows += 1
+            try:
+                if isinstance(record, RowError):
+                    raise record
+                package = _build(record)
+            except (ValidationError, TypeError, ValueError) as e:
+                messages = getattr(e, 'message_dict', None) or {'row': [str(e)]}
+                report.add_error(line, '; '.join(f'{field}: {" ".join(errors)}' for field, errors in messages.items()))
+                continue
+            package._import_line = line
+            candidates.append(package)
+
+        candidates = _assign_ids(candidates, report)
+        if dry_run:
+            report.created += len(candidates)
+            continue
+        if not candidates:
+            continue
+
+        with transaction.atomic():
+            created = Package.objects.bulk_create(candidates, batch_size=batch_size)
+            TrackingEvent.objects.bulk_create(
+                [TrackingEvent.for_package(package) for package in created], batch_size=batch_size
+            )
+            if notify:
+                OutboundEmail.objects.bulk_create([
+                    OutboundEmail(package=package, recipient=package.email)
+                    for package in created if package.email
+                ], batch_size=batch_size)
+            # Bind this batch's codes now; the loop rebinds the name before an outer commit
+            codes = [package.tracking_code for package in created]
+            transaction.on_commit(lambda codes=codes: forget_codes(codes))
+        report.created += len(created)
+        logger.info(f"Imported {report.created} packages so far")
+    return report
+
+
+def _assign_ids(candidates, report):
+    """Give every row a tracking code and package ID, dropping rows that clash with existing ones"""
+    for field, allocator in (('tracking_code', tracking_codes), ('package_id', package_ids)):
+        supplied = [package for package in candidates if package._given_ids[field]]
+        taken = set(Package.objects.filter(
+            **{f'{field}__in': [getattr(package, field) for package in supplied]}
+        ).values_list(field, flat=True)) if supplied else set()
+
+        seen = set()
+        kept = []
+        for package in candidates:
+            value = getattr(package, field)
+            if package._given_ids[field] and (value in taken or value in seen):
+                report.add_error(package._import_line, f'{field}: {value} already exists')
+                continue
+            seen.add(value)
+            kept.append(package)
+        candidates = kept
+
+        fresh = [package for package in candidates if not package._given_ids[field]]
+        for package, value in zip(fresh, allocator.allocate_many(len(fresh))):
+            setattr(package, field, value)
+    return candidates
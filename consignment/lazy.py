@@ -0,0 +1,67 @@
+import importlib
+import logging
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Module name -> (seconds spent importing it, number of modules it pulled in)
+import_timings = {}
+
+# Heavy third-party packages that should stay out of a worker until needed
+HEAVY_PACKAGES = ('plotly', 'reportlab')
+
+_lock = threading.Lock()
+
+
+def timed_import(name):
+    """Import a module, recording how long it took the first time"""
+    if name in sys.modules:
+        return sys.modules[name]
+    with _lock:
+        before = len(sys.modules)
+        started = time.perf_counter()
+        module = importlib.import_module(name)
+        elapsed = time.perf_counter() - started
+        import_timings.setdefault(name, (elapsed, len(sys.modules) - before))
+    logger.info(f"Imported {name} in {elapsed * 1000:.1f}ms ({len(sys.modules) - before} modules)")
+    return module
+
+
+class LazyModule:
+    """Stand-in for a module that is only imported on first attribute access.
+
+    views.py reaches plotly and reportlab through these so a worker that
+    only serves the landing or legal pages never pays for loading them.
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = timed_import(self._name)
+        return getattr(self._module, attr)
+
+    def __repr__(self):
+        state = 'loaded' if self._module is not None else 'not loaded'
+        return f'<LazyModule {self._name} ({state})>'
+
+
+def startup_report(modules):
+    """Time the given modules' imports and list which heavy packages they dragged in"""
+    lines = []
+    for name in modules:
+        loaded_before = name in sys.modules
+        timed_import(name)
+        if loaded_before and name not in import_timings:
+            lines.append(f'{name}: already imported')
+        else:
+            elapsed, count = import_timings[name]
+            lines.append(f'{name}: {elapsed * 1000:.1f}ms, {count} modules')
+    for package in HEAVY_PACKAGES:
+        state = 'loaded' if package in sys.modules else 'not loaded'
+        lines.append(f'{package}: {state}')
+    return lines
@@ -0,0 +1,129 @@
+import re
+import time
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+from .ids import TRACKING_DIGITS, TRACKING_PREFIX
+
+# Every code ever issued is the prefix plus 14 digits: the random codes of old
+# and the allocator's 13 digits + check digit. Legacy codes have no check
+# digit, so only the shape can be verified here.
+TRACKING_CODE_RE = re.compile(rf'^{TRACKING_PREFIX}\d{{{TRACKING_DIGITS + 1}}}$')
+
+# Cached "no such package" marker, distinct from a cache miss (None)
+_MISSING = ''
+
+
+def normalize_code(code):
+    """Accept codes typed in lower case or with spaces and dashes"""
+    return re.sub(r'[\s-]', '', code or '').upper()
+
+
+def is_well_formed(code):
+    return bool(TRACKING_CODE_RE.match(code))
+
+
+def lookup_key(code):
+    return f'track_lookup:{code}'
+
+
+def cache_is_shared():
+    """Whether every worker process sees the same cache, so one can drop what another stored"""
+    return not isinstance(caches[DEFAULT_CACHE_ALIAS], (LocMemCache, DummyCache))
+
+
+def forget_codes(codes):
+    """Drop cached lookups (found or not) for codes that were created, changed or deleted"""
+    cache.delete_many([lookup_key(code) for code in codes if code])
+
+
+def _package_ids(code):
+    from .models import Package
+
+    return Package.objects.filter(tracking_code=code).values_list('package_id', flat=True)
+
+
+def _lookup_timeout(package_id):
+    if package_id is None:
+        # Short-lived, so a code created by a bulk path shows up soon regardless
+        return getattr(settings, 'TRACK_MISS_CACHE_TIMEOUT', 60)
+    return getattr(settings, 'TRACK_HIT_CACHE_TIMEOUT', 60 * 60 * 24)
+
+
+def find_package_id(code):
+    """The package_id for a normalized tracking code, or None; repeats are served from the cache.
+
+    Only a shared cache is used: forget_codes can't reach other workers'
+    process-local caches, which would keep sending a changed code to the old
+    package for up to TRACK_HIT_CACHE_TIMEOUT.
+    """
+    if not is_well_formed(code):
+        return None
+    if not cache_is_shared():
+        return _package_ids(code).first()
+    key = lookup_key(code)
+    package_id = cache.get(key)
+    if package_id is None:
+        package_id = _package_ids(code).first()
+        cache.set(key, package_id or _MISSING, _lookup_timeout(package_id))
+    return package_id or None
+
+
+async def afind_package_id(code):
+    """find_package_id for async views"""
+    if not is_well_formed(code):
+        return None
+    if not cache_is_shared():
+        return await _package_ids(code).afirst()
+    key = lookup_key(code)
+    package_id = await cache.aget(key)
+    if package_id is None:
+        package_id = await _package_ids(code).afirst()
+        await cache.aset(key, package_id or _MISSING, _lookup_timeout(package_id))
+    return package_id or None
+
+
+def client_ip(request):
+    """The caller's address, looking past the configured number of trusted proxies"""
+    proxies = getattr(settings, 'TRACK_TRUSTED_PROXY_COUNT', 0)
+    forwarded = [ip.strip() for ip in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if ip.strip()]
+    if proxies and len(forwarded) >= proxies:
+        return forwarded[-proxies]
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def take_token(ip):
+    """Token bucket per IP, kept in the cache: False once the caller has run out.
+
+    Buckets refill at TRACK_RATE_PER_MINUTE and hold at most TRACK_BURST
+    tokens. Read-modify-write isn't atomic, so concurrent requests may
+    occasionally share a token; that is close enough to stop enumeration.
+    With a process-local cache each worker keeps its own buckets, so the
+    limit is multiplied by the number of workers (check --deploy warns).
+    """
+    key = f'track_bucket:{ip}'
+    allowed, bucket, timeout = _spend(cache.get(key))
+    cache.set(key, bucket, timeout)
+    return allowed
+
+
+async def atake_token(ip):
+    """take_token for async views"""
+    key = f'track_bucket:{ip}'
+    allowed, bucket, timeout = _spend(await cache.aget(key))
+    await cache.aset(key, bucket, timeout)
+    return allowed
+
+
+def _spend(bucket):
+    """(allowed, new bucket, its timeout) after refilling `bucket` and taking a token from it"""
+    rate = getattr(settings, 'TRACK_RATE_PER_MINUTE', 20) / 60
+    burst = getattr(settings, 'TRACK_BURST', 10)
+    now = time.time()
+    tokens, updated = bucket or (burst, now)
+    tokens = min(burst, tokens + (now - updated) * rate)
+    allowed = tokens >= 1
+    return allowed, (tokens - 1 if allowed else tokens, now), int(burst / rate) + 1
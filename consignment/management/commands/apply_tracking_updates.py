@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from consignment.importers import RowError, chunked, read_rows, text_stream
+from consignment.updates import apply_tracking_updates
+
+
+class Command(BaseCommand):
+    help = 'Apply a carrier feed of (tracking_code, status, location, note) updates from CSV or JSON Lines'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='defaults to the file extension')
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+        started = time.perf_counter()
+        totals = {'updated': 0, 'unchanged': 0, 'not_found': 0, 'errors': 0}
+        try:
+            with open(path, 'rb') as source:
+                for batch in chunked(read_rows(text_stream(source), fmt), options['batch_size']):
+                    updates = []
+                    for line, row in batch:
+                        if isinstance(row, RowError):
+                            totals['errors'] += 1
+                            self.stderr.write(f'rejected: line {line}: {row}')
+                            continue
+                        # CSV feeds leave unused columns empty; treat those as "no change"
+                        updates.append({key: value for key, value in row.items() if value != ''})
+                    report = apply_tracking_updates(updates)
+                    for key, value in report.as_dict().items():
+                        totals[key] += value if isinstance(value, int) else len(value)
+                    for code in report.not_found:
+                        self.stderr.write(f'not found: {code}')
+                    for error in report.errors:
+                        self.stderr.write(f"rejected: {error}")
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{totals['updated']} updated, {totals['unchanged']} unchanged, {totals['not_found']} not found, "
+            f"{totals['errors']} rejected in {time.perf_counter() - started:.1f}s"
+        ))
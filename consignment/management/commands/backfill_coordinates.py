@@ -0,0 +1,81 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from consignment.geocoding import geocode_many
+from consignment.models import Package
+
+
+class Command(BaseCommand):
+    help = ('Geocode package locations that have no stored coordinates yet, at most GEOCODE_MAX_RATE '
+            'Nominatim requests a second')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--all', action='store_true', help='recompute coordinates for every package')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        packages = Package.objects.all()
+        if not options['all']:
+            missing = Q()
+            for field, (lat_field, _) in Package.LOCATION_FIELDS.items():
+                missing |= Q(**{f'{field}__isnull': False, f'{lat_field}__isnull': True})
+            packages = packages.filter(missing)
+
+        fields = list(Package.LOCATION_FIELDS)
+        coordinate_fields = [name for pair in Package.LOCATION_FIELDS.values() for name in pair]
+        packages = packages.only('pk', 'package_id', *fields, *coordinate_fields).order_by('pk')
+
+        # Resolve each distinct address once, however many packages share it
+        resolved = {}
+        updated = skipped = 0
+        batch = []
+        for package in packages.iterator(chunk_size=batch_size):
+            batch.append(package)
+            if len(batch) >= batch_size:
+                batch_updated, batch_skipped = self.update_batch(batch, resolved, options['all'])
+                updated, skipped = updated + batch_updated, skipped + batch_skipped
+                batch = []
+        if batch:
+            batch_updated, batch_skipped = self.update_batch(batch, resolved, options['all'])
+            updated, skipped = updated + batch_updated, skipped + batch_skipped
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Updated {updated} packages ({len(resolved)} distinct addresses geocoded), '
+            f'skipped {skipped} whose addresses changed meanwhile'
+        ))
+
+    def update_batch(self, batch, resolved, recompute):
+        pending = []
+        for package in batch:
+            package._backfill_fields = list(Package.LOCATION_FIELDS) if recompute else package.missing_coordinates()
+            pending += [getattr(package, field) for field in package._backfill_fields
+                        if getattr(package, field) and getattr(package, field) not in resolved]
+        if pending:
+            # Paced by the geocoding client's process-wide rate limit, so this takes a while
+            resolved.update(geocode_many(pending))
+
+        now = timezone.now()
+        for package in batch:
+            for field in package._backfill_fields:
+                lat, lon = resolved.get(getattr(package, field), (None, None))
+                lat_field, lon_field = Package.LOCATION_FIELDS[field]
+                setattr(package, lat_field, lat)
+                setattr(package, lon_field, lon)
+            # The cached detail page embeds the route map; a new updated_at retires it
+            package.updated_at = now
+        coordinate_fields = [name for pair in Package.LOCATION_FIELDS.values() for name in pair]
+        fields = list(Package.LOCATION_FIELDS)
+        with transaction.atomic():
+            # Only write rows whose addresses are still the ones we geocoded, as geocode_package does
+            current = {
+                pk: values for pk, *values in
+                Package.objects.select_for_update().filter(pk__in=[package.pk for package in batch])
+                .values_list('pk', *fields)
+            }
+            unchanged = [package for package in batch
+                         if current.get(package.pk) == [getattr(package, field) for field in fields]]
+            updated = Package.objects.bulk_update(unchanged, coordinate_fields + ['updated_at'])
+        return updated, len(batch) - len(unchanged)
@@ -0,0 +1,54 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand
+from django.template.loader import render_to_string
+
+from consignment.models import Package
+from consignment.notifications import NotificationRenderer
+
+
+class Command(BaseCommand):
+    help = 'Measure notification emails rendered per second for a batch of synthetic packages'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        count = options['count']
+        # Unsaved packages: nothing touches the database
+        packages = [
+            Package(
+                package_id=f'EXP_{i:06d}', tracking_code=f'CE{i:014d}', package_name=f'Bench parcel {i}',
+                sender='Sender Ltd', receiver=f'Receiver {i}', sending_location='Lagos, Nigeria',
+                receiving_location='London, United Kingdom', current_location='Accra, Ghana',
+                email=f'bench{i}@example.com', mode_of_transit='Air', package_status='In Transit',
+                delivery_date=date.today(),
+            )
+            for i in range(count)
+        ]
+
+        def per_call(package):
+            # What send_package_email used to do for every message
+            context = {
+                'tracking_code': package.tracking_code,
+                'destination': package.receiving_location,
+                'current_location': package.current_location,
+                'package': package
+            }
+            render_to_string('emails/package_notification.txt', context)
+            render_to_string('emails/package_notification.html', context)
+
+        started = time.perf_counter()
+        for package in packages:
+            per_call(package)
+        before = count / (time.perf_counter() - started)
+
+        started = time.perf_counter()
+        renderer = NotificationRenderer()
+        for package in packages:
+            renderer.render(package)
+        after = count / (time.perf_counter() - started)
+
+        self.stdout.write(f'render_to_string:     {before:8.1f} emails/s')
+        self.stdout.write(f'NotificationRenderer: {after:8.1f} emails/s ({after / before:.2f}x, CSS inlined)')
@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from consignment.ids import package_ids, tracking_codes
+from consignment.models import Package
+
+
+class Command(BaseCommand):
+    help = 'Time allocating tracking codes and package IDs for many new packages on a throwaway test database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=100_000, help='packages to build and insert')
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        count = options['count']
+        # Never write to the real database: run everything against a test copy
+        test_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            # Blocks reserved before the switch belong to the other database
+            tracking_codes.reset()
+            package_ids.reset()
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                packages = [
+                    Package(package_name=f'Parcel {i}', mode_of_transit='Road', package_status='In Transit')
+                    for i in range(count)
+                ]
+                allocated = time.perf_counter() - started
+            started = time.perf_counter()
+            Package.objects.bulk_create(packages, batch_size=options['batch_size'])
+            inserted = time.perf_counter() - started
+        finally:
+            connection.creation.destroy_test_db(test_name, verbosity=0)
+
+        self.stdout.write(f'Allocated {count} package IDs and tracking codes in {allocated:.2f}s '
+                          f'({count / allocated:,.0f}/s) with {len(queries.captured_queries)} queries')
+        self.stdout.write(f'Inserted them in {inserted:.2f}s ({count / inserted:,.0f}/s)')
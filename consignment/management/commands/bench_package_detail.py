@@ -0,0 +1,127 @@
+import os
+import shutil
+import statistics
+import tempfile
+import threading
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection, connections
+from django.db.backends.signals import connection_created
+from django.test import Client
+from django.urls import reverse
+
+from consignment.models import Package, TrackingEvent
+
+
+class Command(BaseCommand):
+    help = ('Load-test package_detail on a throwaway test database, first opening a new database '
+            'connection per request, then with the connection settings from DATABASE_URL')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help='requests per run')
+        parser.add_argument('--concurrency', type=int, default=8, help='client threads')
+        parser.add_argument('--packages', type=int, default=200)
+        parser.add_argument('--conn-max-age', type=int,
+                            help='CONN_MAX_AGE of the second run, instead of the configured one')
+        parser.add_argument('--warm', action='store_true',
+                            help='let the page cache answer; by default every request renders from the database')
+
+    def handle(self, *args, **options):
+        configured = {key: connection.settings_dict[key] for key in ('CONN_MAX_AGE', 'CONN_HEALTH_CHECKS')}
+        pooled = dict(configured)
+        if options['conn_max_age'] is not None:
+            pooled['CONN_MAX_AGE'] = options['conn_max_age']
+        workdir = None
+        if connection.vendor == 'sqlite':
+            # Django never closes an in-memory database, so use a file that really is reopened
+            workdir = tempfile.mkdtemp()
+            connection.settings_dict['TEST']['NAME'] = os.path.join(workdir, 'bench.sqlite3')
+        # Never load-test the real database: run everything against a test copy
+        test_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            self.stdout.write(f'Using test database {test_name} ({connection.vendor})')
+            if connection.vendor == 'sqlite':
+                self.stdout.write('SQLite connects in microseconds, so expect little difference; '
+                                  'point DATABASE_URL at Postgres to measure one')
+            package_ids = self.seed(options['packages'])
+            runs = [
+                ('new connection per request', {'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False}),
+                (f'CONN_MAX_AGE={pooled["CONN_MAX_AGE"]}, '
+                 f'health checks {"on" if pooled["CONN_HEALTH_CHECKS"] else "off"}', pooled),
+            ]
+            for label, conn_settings in runs:
+                # New connections, one per client thread, are created from this dict
+                connections.settings[connection.alias].update(conn_settings)
+                timings, opened = self.run(package_ids, options['requests'], options['concurrency'], options['warm'])
+                self.report(f'{label} ({opened} connections opened)', timings)
+        finally:
+            connections.settings[connection.alias].update(configured)
+            connections.close_all()
+            connection.creation.destroy_test_db(test_name, verbosity=0)
+            if workdir:
+                shutil.rmtree(workdir, ignore_errors=True)
+
+    def seed(self, count):
+        packages = Package.objects.bulk_create(
+            Package(package_id=f'EXP_L{i:09d}', tracking_code=f'CE8{i:013d}', package_name=f'Load parcel {i}',
+                    mode_of_transit='Road', package_status='In Transit', delivery_update='Out for delivery')
+            for i in range(count)
+        )
+        packages = list(Package.objects.filter(package_id__in=[p.package_id for p in packages]))
+        TrackingEvent.objects.bulk_create(
+            TrackingEvent(package=package, status='In Transit', location=f'Hub {n}')
+            for package in packages for n in range(10)
+        )
+        return [package.package_id for package in packages]
+
+    def run(self, package_ids, total, concurrency, warm):
+        cache.clear()
+        timings, errors = [], []
+        opened = []
+        lock = threading.Lock()
+
+        def count_connection(sender, **kwargs):
+            with lock:
+                opened.append(1)
+
+        def client_thread(index):
+            client = Client()
+            try:
+                for n in range(index, total, concurrency):
+                    package_id = package_ids[n % len(package_ids)]
+                    if not warm:
+                        cache.clear()
+                    started = time.perf_counter()
+                    # The test Client disconnects close_old_connections from request_started and
+                    # request_finished; call it as the handler would so CONN_MAX_AGE applies
+                    close_old_connections()
+                    response = client.get(reverse('track:package_detail', args=[package_id]))
+                    close_old_connections()
+                    elapsed = time.perf_counter() - started
+                    with lock:
+                        (timings if response.status_code == 200 else errors).append(elapsed)
+            finally:
+                connections.close_all()
+
+        connection_created.connect(count_connection)
+        try:
+            threads = [threading.Thread(target=client_thread, args=(i,)) for i in range(concurrency)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            connection_created.disconnect(count_connection)
+        if errors:
+            self.stderr.write(f'{len(errors)} requests failed')
+        return timings, len(opened)
+
+    def report(self, label, timings):
+        if not timings:
+            return
+        timings = sorted(timings)
+        p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+        self.stdout.write(f'{label}: {len(timings)} requests, p50 {statistics.median(timings) * 1000:.2f}ms, '
+                          f'p99 {p99 * 1000:.2f}ms')
@@ -0,0 +1,43 @@
+import io
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from consignment.models import Package
+from consignment.pdf import ReceiptRenderer
+
+
+class Command(BaseCommand):
+    help = 'Measure receipts/second with a fresh renderer per receipt versus the shared one'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=200)
+
+    def handle(self, *args, **options):
+        count = options['count']
+        # Unsaved packages: nothing touches the database
+        packages = [
+            Package(
+                package_id=f'EXP_{i:05d}', tracking_code=f'CE{i:014d}', package_name=f'Bench parcel {i}',
+                sender='Sender Ltd', receiver='Receiver Ltd', sending_location='Lagos, Nigeria',
+                receiving_location='London, United Kingdom', tel='+2340000000', email='bench@example.com',
+                mode_of_transit='Air', package_status='In Transit', package_weight=2.5,
+                shipping_date=date.today(),
+            )
+            for i in range(count)
+        ]
+
+        def run(make_renderer):
+            started = time.perf_counter()
+            for package in packages:
+                make_renderer().render(io.BytesIO(), package)
+            return count / (time.perf_counter() - started)
+
+        # Before: styles rebuilt and the full-size logo read and embedded for every receipt
+        before = run(lambda: ReceiptRenderer(scale_logo=False))
+        shared = ReceiptRenderer()
+        after = run(lambda: shared)
+
+        self.stdout.write(f'per-call setup:  {before:8.1f} receipts/s')
+        self.stdout.write(f'shared renderer: {after:8.1f} receipts/s ({after / before:.2f}x)')
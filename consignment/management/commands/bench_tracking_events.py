@@ -0,0 +1,84 @@
+import random
+import statistics
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from consignment.models import Package, TrackingEvent
+
+
+class Command(BaseCommand):
+    help = 'Seed a throwaway test database with tracking events and time the package timeline query'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--packages', type=int, default=20_000)
+        parser.add_argument('--events', type=int, default=1_000_000)
+        parser.add_argument('--queries', type=int, default=2000)
+        parser.add_argument('--limit', type=int, default=10, help='events per timeline')
+
+    def handle(self, *args, **options):
+        # Never seed the real database: run everything against a test copy
+        test_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            self.stdout.write(f'Using test database {test_name}')
+            package_pks = self.seed(options['packages'], options['events'])
+            self.measure(package_pks, options['queries'], options['limit'])
+        finally:
+            connection.creation.destroy_test_db(test_name, verbosity=0)
+
+    def seed(self, package_count, event_count):
+        started = time.perf_counter()
+        today = date.today()
+        with transaction.atomic():
+            Package.objects.bulk_create((
+                Package(
+                    package_id=f'EXP_B{i:09d}', tracking_code=f'CE9{i:013d}', package_name=f'Bench parcel {i}',
+                    sender='Sender Ltd', receiver='Receiver Ltd', shipping_date=today,
+                )
+                for i in range(package_count)
+            ), batch_size=5000)
+        package_pks = list(Package.objects.values_list('pk', flat=True))
+
+        table = TrackingEvent._meta.db_table
+        sql = (f'INSERT INTO {table} (package_id, timestamp, status, location, note) '
+               f'VALUES (%s, %s, %s, %s, %s)')
+        statuses = [choice for choice, _ in Package.PACKAGE_STATUS_CHOICES]
+        start = timezone.now() - timedelta(days=365)
+        # Raw executemany: building millions of model instances would dominate the run
+        with transaction.atomic(), connection.cursor() as cursor:
+            for offset in range(0, event_count, 50_000):
+                rows = [
+                    (random.choice(package_pks), start + timedelta(seconds=offset + i),
+                     random.choice(statuses), 'Lagos, Nigeria', None)
+                    for i in range(min(50_000, event_count - offset))
+                ]
+                cursor.executemany(sql, rows)
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(f'ANALYZE {table}')
+        self.stdout.write(f'Seeded {package_count} packages and {event_count} events '
+                          f'in {time.perf_counter() - started:.1f}s')
+        return package_pks
+
+    def measure(self, package_pks, query_count, limit):
+        sample = Package.objects.get(pk=package_pks[0])
+        query = TrackingEvent.objects.latest_for(sample, limit)
+        with connection.cursor() as cursor:
+            sql, params = query.query.sql_with_params()
+            cursor.execute(f'EXPLAIN {"QUERY PLAN " if connection.vendor == "sqlite" else ""}{sql}', params)
+            self.stdout.write('Plan:')
+            for row in cursor.fetchall():
+                self.stdout.write(f'  {row[-1]}')
+
+        timings = []
+        for pk in random.choices(package_pks, k=query_count):
+            package = Package(pk=pk)
+            started = time.perf_counter()
+            list(TrackingEvent.objects.latest_for(package, limit))
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+        self.stdout.write(f'{query_count} timeline queries: p50 {statistics.median(timings):.2f}ms, p99 {p99:.2f}ms')
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from consignment import assets
+
+
+class Command(BaseCommand):
+    help = 'Purge, bundle and minify each page\'s stylesheets and extract its critical CSS (run before collectstatic)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='rebuild bundles whose inputs are unchanged')
+        parser.add_argument('--fetch-fonts', action='store_true',
+                            help='download the Google Fonts used by the bundles into static/fonts first')
+
+    def handle(self, *args, **options):
+        if options['fetch_fonts']:
+            urls = sorted({config['google_fonts'] for config in assets.bundles().values() if config.get('google_fonts')})
+            if len(urls) > 1:
+                raise CommandError('Bundles use different Google Fonts URLs; merge them into one to self-host')
+            for url in urls:
+                self.stdout.write(f'Self-hosted {assets.fetch_google_fonts(url)} font faces from {url}')
+
+        started = time.perf_counter()
+        built, skipped = assets.build_bundles(force=options['force'])
+        self.stdout.write(f'Built {len(built)} bundles, skipped {len(skipped)} unchanged '
+                          f'in {time.perf_counter() - started:.1f}s')
+        for name, entry in sorted(assets.load_manifest().items()):
+            self.stdout.write(f'{name}: {entry["source_bytes"] / 1024:.0f} KB of source CSS -> '
+                              f'{entry["bytes"] / 1024:.0f} KB bundle, {entry["critical_bytes"] / 1024:.1f} KB inlined')
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from consignment import images
+
+
+class Command(BaseCommand):
+    help = 'Build resized, recompressed and WebP/AVIF variants of static images (run before collectstatic)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='rebuild images that are unchanged')
+        parser.add_argument('--slot-width', type=int, default=960,
+                            help='image width used to estimate bytes saved per page view')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        built, skipped = images.build_images(force=options['force'])
+        self.stdout.write(f'Built {len(built)} images, skipped {len(skipped)} unchanged '
+                          f'in {time.perf_counter() - started:.1f}s')
+        self.stdout.write(f'Modern formats: {", ".join(images.available_formats()) or "none"}')
+
+        manifest = images.load_manifest()
+        original = sum(entry['bytes'] for entry in manifest.values())
+        served = sum(images.variant_bytes(entry, options['slot_width']) for entry in manifest.values())
+        if served:
+            self.stdout.write(f'Bytes at {options["slot_width"]}px slots: {original / 1024:.0f} KB -> '
+                              f'{served / 1024:.0f} KB ({original / served:.1f}x smaller)')
@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from consignment.models import Package
+from consignment.query_plans import check_query_plans, seed_packages
+
+
+class Command(BaseCommand):
+    help = ('EXPLAIN the hot lookup, admin changelist and (on PostgreSQL) admin search queries against a '
+            'seeded test database and fail on sequential scans')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000)
+
+    def handle(self, *args, **options):
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            raise CommandError(f'{connection.vendor} plans are not checked; use SQLite or PostgreSQL.')
+        if connection.vendor == 'postgresql':
+            self.stdout.write('Planning with enable_seqscan off: each query must be able to use an index')
+        # Never seed the real database: run everything against a test copy
+        test_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            started = time.perf_counter()
+            seed_packages(options['rows'])
+            self.stdout.write(f'Seeded {options["rows"]} packages in {time.perf_counter() - started:.1f}s')
+
+            failures = []
+            for name, plan, scans in check_query_plans(Package.objects.order_by('?').first()):
+                self.stdout.write(self.style.ERROR(f'SEQ SCAN {name}') if scans else f'ok       {name}')
+                for line in plan:
+                    self.stdout.write(f'           {line}')
+                if scans:
+                    failures.append(name)
+        finally:
+            connection.creation.destroy_test_db(test_name, verbosity=0)
+        if failures:
+            raise CommandError(f'Sequential scans in: {", ".join(failures)}')
@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from consignment import receipts
+from consignment.models import Package
+
+
+class Command(BaseCommand):
+    help = 'Export receipts for many packages as one multi-page PDF or a ZIP of PDFs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='file to write')
+        parser.add_argument('package_ids', nargs='*', help='limit to these package IDs (default: all)')
+        parser.add_argument('--format', choices=['zip', 'pdf'], default='zip',
+                            help='pdf holds the whole document in memory until it is written')
+        parser.add_argument('--status', choices=[choice for choice, _ in Package.PACKAGE_STATUS_CHOICES])
+        parser.add_argument('--workers', type=int, default=getattr(settings, 'RECEIPT_EXPORT_WORKERS', 1),
+                            help='processes used to render the ZIP export')
+
+    def handle(self, *args, **options):
+        packages = Package.objects.order_by('pk')
+        if options['package_ids']:
+            packages = packages.filter(package_id__in=options['package_ids'])
+        if options['status']:
+            packages = packages.filter(package_status=options['status'])
+        packages = packages.iterator(chunk_size=500)
+
+        with open(options['output'], 'wb') as output:
+            if options['format'] == 'pdf':
+                receipts.write_combined_receipts(packages, output)
+            else:
+                for chunk in receipts.stream_receipts_zip(packages, workers=options['workers']):
+                    output.write(chunk)
+
+        self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
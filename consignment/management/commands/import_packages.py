@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from consignment.importers import import_packages, read_rows, text_stream
+
+
+class Command(BaseCommand):
+    help = 'Bulk-load packages from a CSV or JSON Lines file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'jsonl'],
+                            help='defaults to the file extension')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--no-notify', action='store_true', help="don't queue notification emails")
+        parser.add_argument('--dry-run', action='store_true', help='validate only, insert nothing')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+        started = time.perf_counter()
+        try:
+            with open(path, 'rb') as source:
+                report = import_packages(
+                    read_rows(text_stream(source), fmt),
+                    batch_size=options['batch_size'],
+                    notify=not options['no_notify'],
+                    dry_run=options['dry_run'],
+                )
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        for line, message in report.errors:
+            self.stderr.write(f'row {line}: {message}')
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"{report}{' (dry run)' if options['dry_run'] else ''} in {elapsed:.1f}s"
+        ))
+        if report.created and not options['dry_run']:
+            self.stdout.write('Run backfill_coordinates to geocode the new packages.')
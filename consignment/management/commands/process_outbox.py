@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from consignment.notifications import process_outbox
+
+
+class Command(BaseCommand):
+    help = 'Send queued notification emails, retrying failures with backoff'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=100, help='rows to claim per batch')
+        parser.add_argument('--loop', action='store_true', help='keep running as a worker process')
+        parser.add_argument('--interval', type=float, default=5, help='seconds to sleep when idle')
+
+    def handle(self, *args, **options):
+        while True:
+            counts = process_outbox(options['limit'])
+            if any(counts.values()):
+                self.stdout.write(
+                    f"sent {counts['sent']}, retrying {counts['retry']}, dead-lettered {counts['dead']}"
+                )
+            if not options['loop']:
+                break
+            if counts['sent'] + counts['retry'] + counts['dead'] < options['limit']:
+                close_old_connections()
+                time.sleep(options['interval'])
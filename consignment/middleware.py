@@ -0,0 +1,43 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+
+class StaticFilesMiddleware(WhiteNoiseMiddleware):
+    """WhiteNoise that also runs natively under ASGI.
+
+    WhiteNoiseMiddleware is sync-only, and one sync middleware is enough for
+    Django to run every request, async views included, in a thread of its own.
+    Here the file lookup stays on the event loop and only opening the file
+    goes to a thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, *args, **kwargs):
+        super().__init__(get_response, *args, **kwargs)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = self.find_file(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            response = await sync_to_async(self.serve, thread_sensitive=False)(static_file, request)
+            if getattr(response, 'file_to_stream', None) is not None:
+                # Otherwise Django reads the whole file into memory to send it (and warns)
+                response.streaming_content = _read_chunks(response.file_to_stream, response.block_size)
+            return response
+        return await self.get_response(request)
+
+
+async def _read_chunks(file, block_size):
+    read = sync_to_async(file.read, thread_sensitive=False)
+    while chunk := await read(block_size):
+        yield chunk
@@ -0,0 +1,43 @@
+# Generated by Django 4.2 on 2026-10-18 06:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('consignment', '0013_geocodecacheentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='package',
+            name='current_latitude',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='package',
+            name='current_longitude',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='package',
+            name='receiving_latitude',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='package',
+            name='receiving_longitude',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='package',
+            name='sending_latitude',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='package',
+            name='sending_longitude',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+    ]
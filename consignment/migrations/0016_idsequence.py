@@ -0,0 +1,37 @@
+# Generated by Django 4.2 on 2026-10-18 06:30
+
+from django.db import migrations, models
+
+
+SEQUENCES = ['consignment_tracking_code_seq', 'consignment_package_id_seq']
+
+
+def create_sequences(apps, schema_editor):
+    # Native sequences back the ID allocator on PostgreSQL (see consignment/ids.py)
+    if schema_editor.connection.vendor == 'postgresql':
+        for name in SEQUENCES:
+            schema_editor.execute(f'CREATE SEQUENCE IF NOT EXISTS {name}')
+
+
+def drop_sequences(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        for name in SEQUENCES:
+            schema_editor.execute(f'DROP SEQUENCE IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('consignment', '0015_outboundemail'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdSequence',
+            fields=[
+                ('name', models.CharField(max_length=32, primary_key=True, serialize=False)),
+                ('next_value', models.BigIntegerField(default=1)),
+            ],
+        ),
+        migrations.RunPython(create_sequences, drop_sequences),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2 on 2026-10-18 06:34
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('consignment', '0016_idsequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrackingEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timestamp', models.DateTimeField(default=django.utils.timezone.now)),
+                ('status', models.CharField(choices=[('Shipment Processed', 'Shipment Processed'), ('In Transit', 'In Transit'), ('Hold', 'Hold'), ('Delivered', 'Delivered')], max_length=32)),
+                ('location', models.CharField(blank=True, max_length=300, null=True)),
+                ('note', models.TextField(blank=True, null=True)),
+                ('package', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='events', to='consignment.package')),
+            ],
+            options={
+                'verbose_name_plural': 'Tracking events',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='trackingevent',
+            index=models.Index(fields=['package', 'timestamp'], name='event_package_time_idx'),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 4.2 on 2026-10-18 06:37
+
+from django.db import migrations, models
+
+
+INDEXES = [
+    models.Index(fields=['package_status', 'shipping_date'], name='package_status_date_idx'),
+    models.Index(fields=['mode_of_transit', 'shipping_date'], name='package_transit_date_idx'),
+    models.Index(fields=['shipping_date'], name='package_shipping_date_idx'),
+]
+
+# Admin search runs UPPER(column) LIKE UPPER('%term%') on every search field;
+# only a trigram index on that same expression can serve it
+TRIGRAM_FIELDS = ['package_name', 'package_id', 'tracking_code']
+
+
+def create_indexes(apps, schema_editor):
+    Package = apps.get_model('consignment', 'Package')
+    if schema_editor.connection.vendor != 'postgresql':
+        for index in INDEXES:
+            schema_editor.add_index(Package, index)
+        return
+
+    # CONCURRENTLY keeps consignment_package writable while a large table is
+    # indexed; it can't run in a transaction, hence atomic = False below
+    for index in INDEXES:
+        schema_editor.add_index(Package, index, concurrently=True)
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for field in TRIGRAM_FIELDS:
+        schema_editor.execute(
+            f'CREATE INDEX CONCURRENTLY IF NOT EXISTS package_{field}_trgm_idx '
+            f'ON consignment_package USING gin (UPPER({field}::text) gin_trgm_ops)'
+        )
+
+
+def drop_indexes(apps, schema_editor):
+    Package = apps.get_model('consignment', 'Package')
+    if schema_editor.connection.vendor != 'postgresql':
+        for index in INDEXES:
+            schema_editor.remove_index(Package, index)
+        return
+
+    for field in TRIGRAM_FIELDS:
+        schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS package_{field}_trgm_idx')
+    for index in INDEXES:
+        schema_editor.remove_index(Package, index, concurrently=True)
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('consignment', '0017_trackingevent'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[migrations.AddIndex(model_name='package', index=index) for index in INDEXES],
+            database_operations=[migrations.RunPython(create_indexes, drop_indexes)],
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2 on 2026-10-18 07:05
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('consignment', '0018_package_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='package',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -1,88 +1,23 @@
-import random
-import string
-from django.db import models
-from django.core.mail import send_mail
-from django.template.loader import render_to_string
-from django.conf import settings
-from django.db.models.signals import post_save
+from django.db import models, transaction
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
 from django.dispatch import receiver
+from django.utils import timezone
 import logging
-import socket
-from smtplib import SMTPException
 
 logger = logging.getLogger(__name__)
 
-def send_package_email(package):
-    """Send email notification with tracking information"""
-    
-    if not package.email:
-        logger.warning(f"No email address provided for package {package.package_id}")
-        return False
-
-    subject = "Shipment Notification - Your Package is on the Way!"
-    context = {
-        'tracking_code': package.tracking_code,
-        'destination': package.receiving_location,
-        'current_location': package.current_location,
-        'package': package
-    }
-
-    # Set socket timeout
-    socket.setdefaulttimeout(30)  # 30 seconds timeout
-
-    try:
-        text_content = render_to_string('emails/package_notification.txt', context)
-        html_content = render_to_string('emails/package_notification.html', context)
-        
-        send_mail(
-            subject=subject,
-            message=text_content,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[package.email],
-            fail_silently=False,
-            html_message=html_content
-        )
-        logger.info(f"Email sent successfully for package {package.package_id}")
-        return True
-    except socket.timeout:
-        logger.error(f"Connection timeout while sending email for package {package.package_id}")
-        return False
-    except SMTPException as smtp_error:
-        logger.error(f"SMTP error while sending email for package {package.package_id}: {str(smtp_error)}")
-        return False
-    except Exception as e:
-        logger.error(f"Unexpected error while sending email for package {package.package_id}: {str(e)}")
-        return False
-
 def generate_tracking_code():
-    # Start with 'CB' for Tracking
-    start_letters = 'CE'
-    # Generate random digits for middle section
-    middle_digits = ''.join(random.choices(string.digits, k=14))
-    
-    tracking_code = f"{start_letters}{middle_digits}"
-    
-    # Check if tracking code already exists and regenerate if needed
-    while Package.objects.filter(tracking_code=tracking_code).exists():
-        middle_digits = ''.join(random.choices(string.digits, k=14))
-        tracking_code = f"{start_letters}{middle_digits}"
-    
-    return tracking_code
+    # 'CE' + 13 digits + check digit, from a block reserved in advance
+    from .ids import tracking_codes
+
+    return tracking_codes.allocate()
 
 def generate_package_id():
-    # Start with 'EXP' for Package
-    start_letters = 'EXP'
-    # Generate random digits for middle section
-    middle_digits = ''.join(random.choices(string.digits, k=4))
-    
-    package_id = f"{start_letters}_{middle_digits}"
-    
-    # Check if package ID already exists and regenerate if needed
-    while Package.objects.filter(package_id=package_id).exists():
-        middle_digits = ''.join(random.choices(string.digits, k=5))
-        package_id = f"{start_letters}_{middle_digits}"
-    
-    return package_id
+    # 'EXP_' + 10 digits + check digit, from a block reserved in advance
+    from .ids import package_ids
+
+    return package_ids.allocate()
 
 from datetime import date, timedelta
 
@@ -109,6 +44,19 @@ class Package(models.Model):
     current_location = models.CharField(max_length=300, null=True, blank=True, help_text='name for map iframe')
     package_description = models.TextField(null=True, blank=True)
 
+    # Filled in by geocoding.geocode_package whenever the matching location changes
+    sending_latitude = models.FloatField(null=True, blank=True, editable=False)
+    sending_longitude = models.FloatField(null=True, blank=True, editable=False)
+    current_latitude = models.FloatField(null=True, blank=True, editable=False)
+    current_longitude = models.FloatField(null=True, blank=True, editable=False)
+    receiving_latitude = models.FloatField(null=True, blank=True, editable=False)
+    receiving_longitude = models.FloatField(null=True, blank=True, editable=False)
+
+    LOCATION_FIELDS = {
+        'sending_location': ('sending_latitude', 'sending_longitude'),
+        'current_location': ('current_latitude', 'current_longitude'),
+        'receiving_location': ('receiving_latitude', 'receiving_longitude'),
+    }
 
 
     MODE_OF_TRANSIT_CHOICES = [
@@ -133,19 +81,249 @@ class Package(models.Model):
 
     shipping_date = models.DateField(default=default_shipping_date, null=True, blank=True)
     delivery_date = models.DateField(default=default_delivery_date, null=True, blank=True)
+    # Versions the cached detail page; bulk and queryset updates must set it themselves
+    updated_at = models.DateTimeField(auto_now=True)
 
 
     class Meta:
         verbose_name_plural = 'Packages'
+        # Admin list filters; tracking_code and package_id are covered by their unique
+        # indexes, and name search by trigram indexes on PostgreSQL (migration 0018)
+        indexes = [
+            models.Index(fields=['package_status', 'shipping_date'], name='package_status_date_idx'),
+            models.Index(fields=['mode_of_transit', 'shipping_date'], name='package_transit_date_idx'),
+            models.Index(fields=['shipping_date'], name='package_shipping_date_idx'),
+        ]
 
     def __str__(self):
         return f'{self.package_name} ({self.package_id}) '
 
+    def coordinates_for(self, location_field):
+        lat_field, lon_field = self.LOCATION_FIELDS[location_field]
+        return getattr(self, lat_field), getattr(self, lon_field)
+
+    def missing_coordinates(self):
+        """Location fields that are set but have not been geocoded yet"""
+        return [
+            field for field in self.LOCATION_FIELDS
+            if getattr(self, field) and None in self.coordinates_for(field)
+        ]
+
+
+class GeocodeCacheEntry(models.Model):
+    """Persistent geocoding result, shared by all workers and kept across restarts"""
+    address_key = models.CharField(max_length=40, unique=True, help_text='sha1 of the normalized address')
+    address = models.TextField()
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    found = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+    last_used_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        verbose_name_plural = 'Geocode cache entries'
+
+    def __str__(self):
+        return self.address
+
+    @property
+    def coordinates(self):
+        return (self.latitude, self.longitude) if self.found else (None, None)
+
+class IdSequence(models.Model):
+    """Next unreserved value of an ID sequence on backends without native sequences"""
+    name = models.CharField(max_length=32, primary_key=True)
+    next_value = models.BigIntegerField(default=1)
+
+    def __str__(self):
+        return f'{self.name}: {self.next_value}'
+
+class OutboundEmail(models.Model):
+    """Notification queued in the same transaction as the change that triggered it.
+
+    Rows are delivered by notifications.process_outbox (manage.py process_outbox),
+    so saving a package never waits on the mail server.
+    """
+    PENDING = 'pending'
+    SENT = 'sent'
+    DEAD = 'dead'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (SENT, 'Sent'),
+        (DEAD, 'Dead-lettered'),
+    ]
+    PACKAGE_CREATED = 'package_created'
+    KIND_CHOICES = [
+        (PACKAGE_CREATED, 'Package created'),
+    ]
+
+    package = models.ForeignKey(Package, on_delete=models.CASCADE, related_name='outbound_emails')
+    kind = models.CharField(max_length=32, choices=KIND_CHOICES, default=PACKAGE_CREATED)
+    recipient = models.EmailField(max_length=100)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    # Set while a process_outbox worker is sending the row; a lapsed lease makes it due again
+    leased_until = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name_plural = 'Outbound emails'
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_due_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.get_kind_display()} to {self.recipient} ({self.status})'
+
+class TrackingEventQuerySet(models.QuerySet):
+    def latest_for(self, package, limit=10):
+        """The package's most recent events, newest first, in one indexed query"""
+        return self.filter(package=package).order_by('-timestamp')[:limit]
+
+    def update(self, **kwargs):
+        raise TypeError('Tracking events are append-only')
+
+    update.queryset_only = True
+
+    def delete(self):
+        raise TypeError('Tracking events are append-only')
+
+    delete.queryset_only = True
+
+
+class TrackingEvent(models.Model):
+    """One entry of a package's tracking history; rows are only ever inserted"""
+    package = models.ForeignKey(Package, on_delete=models.CASCADE, related_name='events')
+    timestamp = models.DateTimeField(default=timezone.now)
+    status = models.CharField(max_length=32, choices=Package.PACKAGE_STATUS_CHOICES)
+    location = models.CharField(max_length=300, null=True, blank=True)
+    note = models.TextField(null=True, blank=True)
+
+    objects = TrackingEventQuerySet.as_manager()
+
+    class Meta:
+        verbose_name_plural = 'Tracking events'
+        indexes = [
+            models.Index(fields=['package', 'timestamp'], name='event_package_time_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.package_id} {self.status} at {self.timestamp:%Y-%m-%d %H:%M}'
+
+    @classmethod
+    def for_package(cls, package, timestamp=None):
+        """Unsaved event capturing the package's current status, location and note"""
+        return cls(
+            package=package,
+            timestamp=timestamp or timezone.now(),
+            status=package.package_status,
+            location=package.current_location,
+            note=package.delivery_update,
+        )
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise TypeError('Tracking events are append-only')
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise TypeError('Tracking events are append-only')
+
+@receiver(post_init, sender=Package)
+def remember_locations(sender, instance, **kwargs):
+    """Snapshot the location fields so saves can tell which ones changed"""
+    # Read __dict__ directly so deferred fields are not fetched one query at a time
+    instance._saved_locations = {
+        field: instance.__dict__[field] for field in Package.LOCATION_FIELDS if field in instance.__dict__
+    }
+    instance._saved_status = instance.__dict__.get('package_status')
+    instance._saved_tracking_code = instance.__dict__.get('tracking_code')
+
+@receiver(pre_save, sender=Package)
+def detect_tracking_change(sender, instance, **kwargs):
+    """Flag saves that move the package or change its status for the event history"""
+    instance._tracking_changed = instance._state.adding or (
+        ('package_status' in instance.__dict__ and instance.package_status != instance._saved_status)
+        or ('current_location' in instance._saved_locations
+            and instance.__dict__.get('current_location') != instance._saved_locations['current_location'])
+    )
+
+@receiver(post_save, sender=Package)
+def record_tracking_event(sender, instance, **kwargs):
+    if instance.__dict__.pop('_tracking_changed', False):
+        TrackingEvent.for_package(instance).save()
+
+@receiver(pre_save, sender=Package)
+def clear_stale_coordinates(sender, instance, **kwargs):
+    """Drop coordinates of locations edited since load so they are never served stale"""
+    if instance._state.adding:
+        instance._changed_locations = instance.missing_coordinates()
+    else:
+        instance._changed_locations = [
+            field for field, old in instance._saved_locations.items()
+            if instance.__dict__.get(field) != old
+        ]
+    if instance._changed_locations and not instance._state.adding:
+        from .utils import tracking_map_cache_key
+
+        old = {field: instance._saved_locations.get(field, getattr(instance, field)) for field in Package.LOCATION_FIELDS}
+        instance._stale_map_key = tracking_map_cache_key(**old)
+    for field in instance._changed_locations:
+        lat_field, lon_field = Package.LOCATION_FIELDS[field]
+        setattr(instance, lat_field, None)
+        setattr(instance, lon_field, None)
+
+@receiver(post_save, sender=Package)
+def invalidate_tracking_map(sender, instance, **kwargs):
+    """Forget the rendered map of the route this package was on before the save"""
+    stale_key = instance.__dict__.pop('_stale_map_key', None)
+    if stale_key:
+        cache.delete(stale_key)
+
+@receiver(post_save, sender=Package)
+def invalidate_receipt(sender, instance, created, **kwargs):
+    """Remove this package's stored receipts that no longer match its fields"""
+    if not created:
+        from .receipts import invalidate_receipts, receipt_path
+
+        invalidate_receipts(instance.package_id, keep=receipt_path(instance))
+
+@receiver(post_delete, sender=Package)
+def delete_receipts(sender, instance, **kwargs):
+    from .receipts import invalidate_receipts
+
+    invalidate_receipts(instance.package_id)
+
+@receiver(post_save, sender=Package)
+@receiver(post_delete, sender=Package)
+def forget_tracking_lookups(sender, instance, **kwargs):
+    """Drop cached lookups of the package's codes, including a "not found" for a new one"""
+    from .lookup import forget_codes
+
+    codes = [instance.tracking_code, instance._saved_tracking_code]
+    transaction.on_commit(lambda: forget_codes(codes))
+
+@receiver(post_save, sender=Package)
+def schedule_geocoding_handler(sender, instance, created, **kwargs):
+    """Geocode changed locations in the background once the save commits"""
+    from .geocoding import schedule_package_geocoding
+
+    if getattr(instance, '_changed_locations', None):
+        schedule_package_geocoding(instance.pk)
+    remember_locations(sender, instance)
+
 @receiver(post_save, sender=Package)
 def package_notification_handler(sender, instance, created, **kwargs):
-    """Send email notification when a new package is created"""
+    """Queue an email notification when a new package is created"""
     if created:
-        send_package_email(instance)
+        if not instance.email:
+            logger.warning(f"No email address provided for package {instance.package_id}")
+            return
+        OutboundEmail.objects.create(package=instance, recipient=instance.email)
 
 # Connect the signal
 post_save.connect(package_notification_handler, sender=Package)
\ No newline at end of file
@@ -0,0 +1,257 @@
+import logging
+import re
+import time
+from collections import namedtuple
+from datetime import timedelta
+from smtplib import SMTPServerDisconnected
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.template import Context, Engine, Template
+from django.utils import timezone
+
+from .models import OutboundEmail
+
+logger = logging.getLogger(__name__)
+
+SUBJECT = "Shipment Notification - Your Package is on the Way!"
+
+
+_STYLE_BLOCK = re.compile(r'<style[^>]*>(.*?)</style>', re.S | re.I)
+_CSS_RULE = re.compile(r'([^{}]+)\{([^{}]*)\}')
+_START_TAG = re.compile(r'<([a-zA-Z][a-zA-Z0-9]*)(\s[^<>]*?)?(/?)>')
+_ATTR = '\\s{}\\s*=\\s*"([^"]*)"'
+
+
+def _declarations(body):
+    return [
+        (name.strip(), value.strip())
+        for name, _, value in (part.partition(':') for part in body.split(';'))
+        if name.strip() and value.strip()
+    ]
+
+
+def inline_css(html):
+    """Copy the rules of the <style> block onto matching elements as style="" attributes.
+
+    Handles the simple tag and .class selectors our email templates use (many
+    mail clients ignore <style>); class rules override tag rules and existing
+    inline styles override both. The <style> block itself is kept.
+    """
+    rules = []
+    for style in _STYLE_BLOCK.findall(html):
+        for selectors, body in _CSS_RULE.findall(style):
+            declarations = _declarations(body)
+            for selector in selectors.split(','):
+                selector = selector.strip()
+                if re.fullmatch(r'\.?[A-Za-z][\w-]*', selector):
+                    rules.append((selector, declarations))
+    if not rules:
+        return html
+
+    head_end = html.lower().find('</head>')
+
+    def apply(match):
+        if match.start() < head_end:
+            return match.group(0)
+        tag, attrs, self_closing = match.group(1), match.group(2) or '', match.group(3)
+        class_match = re.search(_ATTR.format('class'), attrs)
+        classes = {f'.{name}' for name in class_match.group(1).split()} if class_match else set()
+        merged = {}
+        for matches in (lambda sel: sel == tag.lower(), lambda sel: sel in classes):
+            for selector, declarations in rules:
+                if matches(selector):
+                    merged.update(declarations)
+        if not merged:
+            return match.group(0)
+        style_match = re.search(_ATTR.format('style'), attrs)
+        if style_match:
+            merged.update(_declarations(style_match.group(1)))
+            attrs = attrs[:style_match.start()] + attrs[style_match.end():]
+        style = '; '.join(f'{name}: {value}' for name, value in merged.items())
+        return f'<{tag}{attrs} style="{style}"{self_closing}>'
+
+    return _START_TAG.sub(apply, html)
+
+
+class NotificationRenderer:
+    """Renders package notifications from templates compiled once per process.
+
+    Uses its own template engine with the cached loader whatever DEBUG says,
+    and inlines the HTML template's CSS once at compile time instead of per
+    message.
+    """
+
+    TEXT_TEMPLATE = 'emails/package_notification.txt'
+    HTML_TEMPLATE = 'emails/package_notification.html'
+
+    def __init__(self):
+        self.engine = Engine(
+            dirs=settings.TEMPLATES[0]['DIRS'],
+            loaders=[('django.template.loaders.cached.Loader', [
+                'django.template.loaders.filesystem.Loader',
+                'django.template.loaders.app_directories.Loader',
+            ])],
+        )
+        self.text_template = self.engine.get_template(self.TEXT_TEMPLATE)
+        html_source, _ = self.engine.find_template(self.HTML_TEMPLATE)
+        self.html_template = Template(inline_css(html_source.source), engine=self.engine)
+
+    def render(self, package):
+        """Return (text, html) bodies for a package"""
+        context = Context({
+            'tracking_code': package.tracking_code,
+            'destination': package.receiving_location,
+            'current_location': package.current_location,
+            'package': package
+        })
+        return self.text_template.render(context), self.html_template.render(context)
+
+
+_renderer = None
+
+
+def get_renderer():
+    global _renderer
+    if _renderer is None:
+        _renderer = NotificationRenderer()
+    return _renderer
+
+
+def build_package_email(package, recipient=None):
+    """Render the shipment notification for a package"""
+    text_content, html_content = get_renderer().render(package)
+
+    message = EmailMultiAlternatives(
+        subject=SUBJECT,
+        body=text_content,
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[recipient or package.email],
+    )
+    message.attach_alternative(html_content, 'text/html')
+    return message
+
+
+def send_package_email(package, recipient=None):
+    """Send the shipment notification now; errors propagate to the caller.
+
+    The SMTP backend applies settings.EMAIL_TIMEOUT to its own socket, so
+    nothing here touches the process-wide socket timeout.
+    """
+    build_package_email(package, recipient).send(fail_silently=False)
+    logger.info(f"Email sent successfully for package {package.package_id}")
+
+
+# Outcome of one message in a batch; `error` is None when it was accepted
+SendResult = namedtuple('SendResult', ['package', 'recipient', 'sent', 'error'])
+
+
+def send_package_emails(recipients, rate=None):
+    """Send notifications for many (package, recipient) pairs over one SMTP connection.
+
+    Messages go out one at a time through the same open connection so each gets
+    its own outcome, throttled to `rate` messages/second (EMAIL_MAX_RATE by
+    default, 0 for no limit). Returns a SendResult per pair, in order.
+    """
+    rate = getattr(settings, 'EMAIL_MAX_RATE', 5) if rate is None else rate
+    interval = 1 / rate if rate else 0
+    recipients = list(recipients)
+    results = []
+
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+    except Exception as e:
+        logger.error(f"Could not connect to the mail server: {e}")
+        return [SendResult(package, recipient, False, e) for package, recipient in recipients]
+
+    next_send = time.monotonic()
+    try:
+        for package, recipient in recipients:
+            delay = next_send - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            next_send = max(next_send, time.monotonic()) + interval
+            try:
+                message = build_package_email(package, recipient)
+                try:
+                    connection.send_messages([message])
+                except SMTPServerDisconnected:
+                    # Providers drop long-lived sessions; reconnect once and resend
+                    connection.close()
+                    connection.open()
+                    connection.send_messages([message])
+            except Exception as e:
+                logger.error(f"Error while sending email for package {package.package_id}: {e}")
+                results.append(SendResult(package, recipient, False, e))
+            else:
+                results.append(SendResult(package, recipient, True, None))
+    finally:
+        connection.close()
+    return results
+
+
+def retry_delay(attempts):
+    """Exponential backoff: base, 2x base, 4x base, ... capped at OUTBOX_RETRY_MAX"""
+    base = getattr(settings, 'OUTBOX_RETRY_BASE', 60)
+    cap = getattr(settings, 'OUTBOX_RETRY_MAX', 60 * 60)
+    return timedelta(seconds=min(cap, base * 2 ** max(attempts - 1, 0)))
+
+
+def claim_due(limit):
+    """Lease up to `limit` due rows so concurrent drainers don't send them twice"""
+    now = timezone.now()
+    lease = timedelta(seconds=getattr(settings, 'OUTBOX_LEASE', 5 * 60))
+    with transaction.atomic():
+        due = list(
+            OutboundEmail.objects.select_for_update(skip_locked=True)
+            .select_related('package')
+            .filter(status=OutboundEmail.PENDING, next_attempt_at__lte=now)
+            .order_by('next_attempt_at')[:limit]
+        )
+        # A worker that dies mid-send leaves the row due again once the lease lapses
+        OutboundEmail.objects.filter(pk__in=[row.pk for row in due]).update(
+            next_attempt_at=now + lease, leased_until=now + lease
+        )
+    return due
+
+
+def record_success(row):
+    row.status = OutboundEmail.SENT
+    row.attempts += 1
+    row.sent_at = timezone.now()
+    row.last_error = ''
+    row.leased_until = None
+    row.save(update_fields=['status', 'attempts', 'sent_at', 'last_error', 'leased_until'])
+
+
+def record_failure(row, error):
+    """Schedule a retry with backoff, or dead-letter the row once attempts run out"""
+    row.attempts += 1
+    row.last_error = f'{type(error).__name__}: {error}'
+    row.leased_until = None
+    if row.attempts >= getattr(settings, 'OUTBOX_MAX_ATTEMPTS', 6):
+        row.status = OutboundEmail.DEAD
+        logger.error(f"Giving up on email {row.pk} for package {row.package.package_id} after {row.attempts} attempts: {error}")
+    else:
+        row.next_attempt_at = timezone.now() + retry_delay(row.attempts)
+        logger.warning(f"Email {row.pk} failed (attempt {row.attempts}), retrying at {row.next_attempt_at}: {error}")
+    row.save(update_fields=['status', 'attempts', 'last_error', 'next_attempt_at', 'leased_until'])
+
+
+def process_outbox(limit=100):
+    """Deliver due outbox rows; returns how many were sent, retried and dead-lettered"""
+    counts = {'sent': 0, 'retry': 0, 'dead': 0}
+    rows = claim_due(limit)
+    if not rows:
+        return counts
+    results = send_package_emails([(row.package, row.recipient) for row in rows])
+    for row, result in zip(rows, results):
+        if result.sent:
+            record_success(row)
+            counts['sent'] += 1
+        else:
+            record_failure(row, result.error)
+            counts['dead' if row.status == OutboundEmail.DEAD else 'retry'] += 1
+    return counts
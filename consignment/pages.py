@@ -0,0 +1,60 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Package
+
+# Bump whenever package_detail_body.html or its context changes shape
+PAGE_TEMPLATE_VERSION = 1
+
+
+def page_key(package_id, version):
+    return f'package_page:v{PAGE_TEMPLATE_VERSION}:{package_id}:{version}'
+
+
+def version_token(updated_at):
+    return f'{updated_at.timestamp():.6f}'
+
+
+def _version_query(package_id):
+    return Package.objects.filter(package_id=package_id).values_list('updated_at', flat=True)
+
+
+def get_page_version(package_id):
+    """The package's version token, from one indexed query, or None if there is no such package.
+
+    Every save moves updated_at, so a page cached under an older token is simply
+    never looked up again, by any worker, whatever cache backend is configured.
+    """
+    updated_at = _version_query(package_id).first()
+    return version_token(updated_at) if updated_at else None
+
+
+async def aget_page_version(package_id):
+    updated_at = await _version_query(package_id).afirst()
+    return version_token(updated_at) if updated_at else None
+
+
+def get_cached_page(package_id, version):
+    """The page context cached for the package at `version`"""
+    return cache.get(page_key(package_id, version))
+
+
+async def aget_cached_page(package_id, version):
+    return await cache.aget(page_key(package_id, version))
+
+
+def page_validators(version):
+    """(ETag, Last-Modified timestamp) of the page rendered at `version`"""
+    return f'"p{PAGE_TEMPLATE_VERSION}-{version}"', int(float(version))
+
+
+def store_page(package, page):
+    """Cache a page rendered from `package` under the version it was read at"""
+    cache.set(page_key(package.package_id, version_token(package.updated_at)), page,
+              getattr(settings, 'PACKAGE_PAGE_CACHE_TIMEOUT', 60 * 60 * 24))
+
+
+async def astore_page(package, page):
+    """store_page for async views"""
+    await cache.aset(page_key(package.package_id, version_token(package.updated_at)), page,
+                     getattr(settings, 'PACKAGE_PAGE_CACHE_TIMEOUT', 60 * 60 * 24))
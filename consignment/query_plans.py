@@ -0,0 +1,128 @@
+import random
+import re
+from datetime import date, timedelta
+
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from .admin import PackageAdmin
+from .models import Package, TrackingEvent
+
+# SQLite reports a full table scan as "SCAN <table>" with no index after it
+_SQLITE_TABLE_SCAN = re.compile(r'^SCAN (\w+)$')
+# PostgreSQL as "Seq Scan on <table>"
+_POSTGRES_TABLE_SCAN = re.compile(r'Seq Scan on (\w+)')
+
+
+def changelist_queries(params):
+    """The SQL the Package changelist runs for a set of filter params, captured from a real ChangeList"""
+    request = RequestFactory().get('/', params)
+    # An unsaved superuser passes the permission checks without a query
+    request.user = User(is_active=True, is_staff=True, is_superuser=True)
+    with CaptureQueriesContext(connection) as queries:
+        changelist = PackageAdmin(Package, admin.site).get_changelist_instance(request)
+        list(changelist.result_list)
+    return [query['sql'] for query in queries.captured_queries]
+
+
+def hot_queries(package, search=False):
+    """(name, sql, params, bounded) for every lookup the site and admin run on each request.
+
+    `bounded` queries are LIMITed pages, which may walk the table in primary
+    key order: that stops after list_per_page matches rather than reading it all.
+    With `search`, the admin search is included too; only PostgreSQL's trigram
+    indexes can serve its LIKE '%term%'.
+    """
+    queries = []
+    for name, queryset in (
+        ('track_package by tracking_code', Package.objects.filter(tracking_code=package.tracking_code)),
+        ('package_detail by package_id', Package.objects.filter(package_id=package.package_id)),
+        ('timeline events', TrackingEvent.objects.latest_for(package)),
+    ):
+        queries.append((name, *queryset.query.sql_with_params(), False))
+
+    today = date.today()
+    last_week = {'shipping_date__gte': str(today - timedelta(days=7)), 'shipping_date__lt': str(today)}
+    for name, params in (
+        ('admin changelist', {}),
+        ('admin filter by status', {'package_status__exact': 'In Transit'}),
+        ('admin filter by transit mode', {'mode_of_transit__exact': 'Sea'}),
+        ('admin filter by shipping date', last_week),
+        ('admin filter by status and date', {'package_status__exact': 'Hold', **last_week}),
+        ('admin filter by mode and date', {'mode_of_transit__exact': 'Air', **last_week}),
+        *([('admin search', {'q': package.package_name})] if search else []),
+    ):
+        for sql in changelist_queries(params):
+            # The paginator's COUNT(*), then the newest-first page
+            is_count = sql.startswith('SELECT COUNT(*)')
+            queries.append((f'{name}: {"count" if is_count else "page"}', sql, None, not is_count))
+    return queries
+
+
+def explain(sql, params=None):
+    """The query's plan as a list of lines"""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(f'EXPLAIN {sql}', params)
+            return [row[0] for row in cursor.fetchall()]
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        return [str(row[-1]) for row in cursor.fetchall()]
+
+
+def sequential_scans(plan, bounded=False, vendor=None):
+    """Plan lines that read a whole table instead of using an index"""
+    if (vendor or connection.vendor) == 'postgresql':
+        # Planned with enable_seqscan off, so a Seq Scan means no index could serve the query
+        return [line for line in plan if _POSTGRES_TABLE_SCAN.search(line)]
+    if bounded and not any('TEMP B-TREE' in line for line in plan):
+        # Rows come out in primary key order, so the LIMIT ends the scan early
+        return []
+    return [line for line in plan if _SQLITE_TABLE_SCAN.match(line.strip())]
+
+
+def check_query_plans(package):
+    """Yield (name, plan, sequential scan lines) for each hot query.
+
+    PostgreSQL's planner weighs selectivity (a status or transit mode filter
+    matches a quarter to a third of the rows) and may rightly prefer a scan,
+    so there the plans are taken with enable_seqscan off: that checks each
+    query, the admin search included, *can* use an index, not that it will.
+    """
+    postgres = connection.vendor == 'postgresql'
+    if postgres:
+        with connection.cursor() as cursor:
+            cursor.execute('SET enable_seqscan = off')
+    try:
+        for name, sql, params, bounded in hot_queries(package, search=postgres):
+            plan = explain(sql, params)
+            yield name, plan, sequential_scans(plan, bounded)
+    finally:
+        if postgres:
+            with connection.cursor() as cursor:
+                cursor.execute('RESET enable_seqscan')
+
+
+def seed_packages(count, batch_size=10_000):
+    """Insert `count` spread-out packages with one tracking event each, for plan checks"""
+    statuses = [choice for choice, _ in Package.PACKAGE_STATUS_CHOICES]
+    modes = [choice for choice, _ in Package.MODE_OF_TRANSIT_CHOICES]
+    today = date.today()
+    offset = Package.objects.count()
+    with transaction.atomic():
+        for start in range(0, count, batch_size):
+            packages = Package.objects.bulk_create([
+                Package(
+                    package_id=f'EXP_Q{offset + i:09d}', tracking_code=f'CE8{offset + i:013d}',
+                    package_name=f'Parcel {offset + i}', mode_of_transit=random.choice(modes),
+                    package_status=random.choice(statuses),
+                    shipping_date=today - timedelta(days=random.randrange(730)),
+                )
+                for i in range(start, min(start + batch_size, count))
+            ])
+            TrackingEvent.objects.bulk_create([TrackingEvent.for_package(package) for package in packages])
+    # Give the planner real statistics, as production has
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
@@ -0,0 +1,185 @@
+import hashlib
+import io
+import json
+import logging
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+from .lazy import LazyModule
+
+logger = logging.getLogger(__name__)
+
+# reportlab is only loaded when a receipt actually has to be rendered
+pdf = LazyModule('consignment.pdf')
+
+# Bump whenever the layout in pdf.py changes so stored receipts are rebuilt
+RECEIPT_TEMPLATE_VERSION = 2
+
+# Package fields printed on the receipt; any change to these yields a new file
+RECEIPT_FIELDS = (
+    'package_id', 'tracking_code', 'shipping_date', 'mode_of_transit', 'sender', 'receiver',
+    'sending_location', 'receiving_location', 'tel', 'email', 'package_name', 'package_weight',
+)
+
+
+def _directory(package_id):
+    return f"{getattr(settings, 'RECEIPT_STORAGE_DIR', 'receipts')}/{package_id}"
+
+
+def receipt_digest(package):
+    """Content address of a package's receipt: a hash of everything printed on it"""
+    values = {field: getattr(package, field) for field in RECEIPT_FIELDS}
+    values['version'] = RECEIPT_TEMPLATE_VERSION
+    payload = json.dumps(values, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]
+
+
+def receipt_path(package, digest=None):
+    return f'{_directory(package.package_id)}/{digest or receipt_digest(package)}.pdf'
+
+
+def get_or_create_receipt(package, digest=None):
+    """Return the storage path of the package's receipt, rendering it on first request"""
+    path = receipt_path(package, digest)
+    if not default_storage.exists(path):
+        buffer = io.BytesIO()
+        pdf.generate_receipt_pdf(buffer, package)
+        saved = default_storage.save(path, ContentFile(buffer.getvalue()))
+        if saved != path:
+            # Another worker stored the same receipt first; keep theirs
+            default_storage.delete(saved)
+    return path
+
+
+def invalidate_receipts(package_id, keep=None):
+    """Delete stored receipts of one package, except the file at `keep`"""
+    directory = _directory(package_id)
+    try:
+        _, files = default_storage.listdir(directory)
+    except (FileNotFoundError, NotImplementedError):
+        return 0
+    removed = 0
+    for name in files:
+        path = f'{directory}/{name}'
+        if path != keep:
+            default_storage.delete(path)
+            removed += 1
+    return removed
+
+
+def render_receipt(package):
+    """Render one receipt straight to bytes, without touching storage"""
+    buffer = io.BytesIO()
+    pdf.generate_receipt_pdf(buffer, package)
+    return buffer.getvalue()
+
+
+def _init_worker():
+    import django
+    from django.apps import apps
+
+    if not apps.ready:
+        django.setup()
+
+
+def _render_failed(package, error):
+    logger.error(f"Skipping receipt of package {package.package_id}: {error}", exc_info=error)
+
+
+def iter_rendered_receipts(packages, workers=None, window=32):
+    """Yield (package, pdf bytes) in order, rendering up to `window` receipts at a time.
+
+    reportlab is CPU-bound, so with `workers` > 1 the receipts are rendered
+    on a process pool. That forks the calling process, threads and all, so
+    it is for export_receipts only; requests render in-process. Only one
+    window of packages and PDFs is held in memory. A package whose receipt
+    fails to render is logged and left out rather than ending the export.
+    """
+    packages = iter(packages)
+    if not workers or workers < 2:
+        for package in packages:
+            try:
+                data = render_receipt(package)
+            except Exception as e:
+                _render_failed(package, e)
+            else:
+                yield package, data
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+        while True:
+            chunk = [package for _, package in zip(range(window), packages)]
+            if not chunk:
+                break
+            futures = [executor.submit(render_receipt, package) for package in chunk]
+            for package, future in zip(chunk, futures):
+                try:
+                    data = future.result()
+                except Exception as e:
+                    _render_failed(package, e)
+                else:
+                    yield package, data
+
+
+class _StreamBuffer:
+    """Write-only file object that hands back whatever was written since the last read"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def read_written(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def stream_receipts_zip(packages, workers=None):
+    """Yield a ZIP archive of one receipt per package, chunk by chunk"""
+    buffer = _StreamBuffer()
+    with zipfile.ZipFile(buffer, mode='w', compression=zipfile.ZIP_STORED) as archive:
+        for package, data in iter_rendered_receipts(packages, workers):
+            archive.writestr(f'package_receipt_{package.package_id}.pdf', data)
+            yield buffer.read_written()
+    yield buffer.read_written()
+
+
+async def astream_receipts_zip(packages):
+    """stream_receipts_zip for ASGI, rendering in-process.
+
+    Django 4.2 reads a synchronous streaming response to the end before
+    sending any of it under ASGI, so each chunk is produced on the sync
+    thread and handed over as it is ready.
+    """
+    chunks = stream_receipts_zip(packages)
+    done = object()
+    while (chunk := await sync_to_async(next)(chunks, done)) is not done:
+        yield chunk
+
+
+def write_combined_receipts(packages, output):
+    """Write every package's receipt into one multi-page PDF.
+
+    A single reportlab document is laid out sequentially, and it holds every
+    page in memory until it is saved, so this is for export_receipts only;
+    requests stream the ZIP export, which keeps one window of receipts at a time.
+    """
+    from reportlab.platypus import PageBreak
+
+    elements = []
+    for package in packages:
+        if elements:
+            elements.append(PageBreak())
+        elements.extend(pdf.renderer.elements(package))
+    pdf.renderer.document(output).build(elements)
@@ -1,19 +1,20 @@
+import hashlib
+from urllib.parse import quote
+from xml.sax.saxutils import escape
+
+from django.conf import settings
 from django.contrib.sitemaps import Sitemap
+from django.core.cache import cache
+from django.db.models import Count, F, Max
+from django.http import Http404, HttpResponse, StreamingHttpResponse
 from django.urls import reverse
-from .models import Package
 
-class PackageSitemap(Sitemap):
-    changefreq = "daily"
-    priority = 0.8
-
-    def items(self):
-        return Package.objects.all()
+from .models import Package
 
-    def location(self, obj):
-        return reverse('track:package_detail', kwargs={'package_id': obj.package_id})
+# URLs per sitemap file, the limit set by the sitemap protocol. Shards cover
+# fixed pk ranges, so a change to one package only retires the shard it is in.
+SHARD_SIZE = 50_000
 
-    def lastmod(self, obj):
-        pass  # Assuming you have an updated_at field
 
 class StaticViewSitemap(Sitemap):
     changefreq = "weekly"
@@ -23,4 +24,115 @@ class StaticViewSitemap(Sitemap):
         return ['track:track_package']  # Add more static view names as needed
 
     def location(self, item):
-        return reverse(item)
\ No newline at end of file
+        return reverse(item)
+
+
+def _site_key(base_url):
+    return hashlib.sha1(base_url.encode()).hexdigest()[:16]
+
+
+def shard_packages(shard):
+    return Package.objects.filter(pk__gte=shard * SHARD_SIZE, pk__lt=(shard + 1) * SHARD_SIZE)
+
+
+def content_version(packages):
+    """Version of a set of packages from one aggregate query, or None if it is empty.
+
+    A save moves Max(updated_at) and a delete the count, so every worker sees
+    the same version whatever cache backend is configured.
+    """
+    state = packages.aggregate(count=Count('pk'), lastmod=Max('updated_at'))
+    if not state['count']:
+        return None
+    return f"{state['count']}-{state['lastmod'].timestamp():.6f}"
+
+
+def _base_url(request):
+    """Scheme and host the URLs are written for; SITEMAP_BASE_URL pins it against spoofed Host headers"""
+    base_url = getattr(settings, 'SITEMAP_BASE_URL', '') or f'{request.scheme}://{request.get_host()}'
+    return base_url.rstrip('/')
+
+
+def _lastmod(value):
+    return value.isoformat(timespec='seconds') if value else None
+
+
+def _url_entry(location, lastmod, changefreq=None, priority=None):
+    parts = [f'<url><loc>{escape(location)}</loc>']
+    if lastmod:
+        parts.append(f'<lastmod>{lastmod}</lastmod>')
+    if changefreq:
+        parts.append(f'<changefreq>{changefreq}</changefreq>')
+    if priority is not None:
+        parts.append(f'<priority>{priority}</priority>')
+    parts.append('</url>\n')
+    return ''.join(parts)
+
+
+def iter_shard_xml(base_url, shard, chunk_size=2000):
+    """Yield one shard's <urlset> in pieces, reading only package_id and updated_at"""
+    # reverse() once; every package URL differs only in its id
+    placeholder = 'PACKAGE-ID'
+    pattern = base_url + reverse('track:package_detail', kwargs={'package_id': placeholder})
+    rows = (shard_packages(shard)
+            .order_by('pk')
+            .values_list('package_id', 'updated_at')
+            .iterator(chunk_size=chunk_size))
+
+    yield ('<?xml version="1.0" encoding="UTF-8"?>\n'
+           '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n')
+    batch = []
+    for package_id, updated_at in rows:
+        batch.append(_url_entry(pattern.replace(placeholder, quote(package_id)), _lastmod(updated_at),
+                                'daily', 0.8))
+        if len(batch) >= chunk_size:
+            yield ''.join(batch)
+            batch = []
+    yield ''.join(batch) + '</urlset>\n'
+
+
+def _cache_as_streamed(key, chunks, timeout):
+    """Pass chunks through, caching the whole document once the last one is sent"""
+    parts = []
+    for chunk in chunks:
+        parts.append(chunk)
+        yield chunk
+    cache.set(key, ''.join(parts), timeout)
+
+
+def package_sitemap(request, shard):
+    version = content_version(shard_packages(shard))
+    if version is None:
+        # Past the last package, or every package in the range is gone; the index doesn't list it
+        raise Http404('No packages in this sitemap shard')
+    base_url = _base_url(request)
+    key = f'sitemap_shard:{_site_key(base_url)}:{shard}:{version}'
+    xml = cache.get(key)
+    if xml is not None:
+        return HttpResponse(xml, content_type='application/xml')
+    timeout = getattr(settings, 'SITEMAP_CACHE_TIMEOUT', 60 * 60 * 24)
+    return StreamingHttpResponse(_cache_as_streamed(key, iter_shard_xml(base_url, shard), timeout),
+                                 content_type='application/xml')
+
+
+def sitemap_index(request):
+    """List the static sitemap and one sitemap per populated pk range, with its newest lastmod"""
+    base_url = _base_url(request)
+    key = f'sitemap_index:{_site_key(base_url)}:{content_version(Package.objects.all())}'
+    xml = cache.get(key)
+    if xml is None:
+        shards = (Package.objects
+                  .annotate(shard=F('pk') / SHARD_SIZE)
+                  .values('shard')
+                  .annotate(lastmod=Max('updated_at'))
+                  .order_by('shard'))
+        entries = [f'<sitemap><loc>{escape(base_url + reverse("sitemap-static"))}</loc></sitemap>\n']
+        for row in shards:
+            location = base_url + reverse('sitemap-packages', kwargs={'shard': row['shard']})
+            entries.append(f'<sitemap><loc>{escape(location)}</loc>'
+                           f'<lastmod>{_lastmod(row["lastmod"])}</lastmod></sitemap>\n')
+        xml = ('<?xml version="1.0" encoding="UTF-8"?>\n'
+               '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+               + ''.join(entries) + '</sitemapindex>\n')
+        cache.set(key, xml, getattr(settings, 'SITEMAP_CACHE_TIMEOUT', 60 * 60 * 24))
+    return HttpResponse(xml, content_type='application/xml')
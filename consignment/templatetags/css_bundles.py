@@ -0,0 +1,86 @@
+import os
+import posixpath
+import re
+
+from django import template
+from django.templatetags.static import static
+from django.utils.html import format_html, format_html_join
+from django.utils.safestring import mark_safe
+
+from consignment import assets
+
+register = template.Library()
+
+_manifest = {'key': None, 'entries': {}}
+
+_URL = re.compile(r'''url\(\s*(['"]?)(?!data:|https?:|/)([^'")]+)\1\s*\)''')
+
+
+def _entries():
+    """The bundle manifest, re-read only when build_css has rewritten it"""
+    path = assets.build_dir() / assets.output_prefix() / assets.MANIFEST_NAME
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return {}
+    if (path, mtime) != _manifest['key']:
+        _manifest['entries'] = assets.load_manifest(path)
+        _manifest['key'] = (path, mtime)
+    return _manifest['entries']
+
+
+def _absolute_urls(css):
+    """Point the relative url()s of inlined CSS at their static files, since it now lives in the page"""
+    def replace(match):
+        path, _, suffix = match.group(2).partition('?')
+        path, _, fragment = path.partition('#')
+        name = posixpath.normpath(posixpath.join(assets.output_prefix(), path))
+        try:
+            url = static(name)
+        except ValueError:
+            # Not in the staticfiles manifest (collectstatic hasn't run), so leave it to the browser
+            return match.group(0)
+        return f'url({url}{"?" + suffix if suffix else ""}{"#" + fragment if fragment else ""})'
+
+    return _URL.sub(replace, css)
+
+
+def _google_fonts(url, tags):
+    return format_html(
+        '<link rel="preconnect" href="https://fonts.gstatic.com" crossorigin>\n'
+        '<link href="{}" rel="stylesheet">\n{}', url, tags,
+    )
+
+
+@register.simple_tag
+def css_bundle(name):
+    """A page's stylesheets: critical CSS inline and the purged bundle loaded without blocking render.
+
+    Until `manage.py build_css` (and collectstatic) has run, every source
+    stylesheet (and the Google Fonts stylesheet) is linked as-is instead.
+    Usage: {% css_bundle 'index' %}
+    """
+    entry = _entries().get(name)
+    config = assets.bundles()[name]
+    try:
+        href = static(entry['css']) if entry else None
+    except ValueError:
+        # Built after the last collectstatic, so the bundle isn't deployed yet
+        href = None
+    if href is None:
+        sources = assets.source_files(config)
+        links = format_html_join('\n', '<link href="{}" rel="stylesheet">', ((static(source),) for source in sources))
+        if config.get('google_fonts') and assets.FONTS_CSS not in sources:
+            links = _google_fonts(config['google_fonts'], links)
+        return links
+
+    tags = format_html(
+        '<style>{}</style>\n'
+        '<link rel="preload" href="{}" as="style" onload="this.onload=null;this.rel=\'stylesheet\'">\n'
+        '<noscript><link href="{}" rel="stylesheet"></noscript>',
+        # "<\/" is the same string to CSS but can't close the <style> element early
+        mark_safe(_absolute_urls(entry['critical']).replace('</', '<\\/')), href, href,
+    )
+    if config.get('google_fonts') and not entry['self_hosted_fonts']:
+        tags = _google_fonts(config['google_fonts'], tags)
+    return tags
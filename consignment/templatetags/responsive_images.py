@@ -0,0 +1,54 @@
+import os
+
+from django import template
+from django.templatetags.static import static
+from django.utils.html import format_html, format_html_join
+
+from consignment import images
+
+register = template.Library()
+
+_manifest = {'key': None, 'entries': {}}
+
+
+def _entries():
+    """The build manifest, re-read only when build_images has rewritten it"""
+    path = images.build_dir() / images.output_prefix() / images.MANIFEST_NAME
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return {}
+    if (path, mtime) != _manifest['key']:
+        _manifest['entries'] = images.load_manifest(path)
+        _manifest['key'] = (path, mtime)
+    return _manifest['entries']
+
+
+def _srcset(variants):
+    return ', '.join(f'{static(path)} {width}w' for width, path, _ in variants)
+
+
+@register.simple_tag
+def responsive_image(name, alt='', sizes='100vw', loading='lazy', **attrs):
+    """<picture> with AVIF/WebP/original srcsets for a static image, or a plain <img> if it wasn't built.
+
+    Usage: {% responsive_image 'images/about.jpg' sizes='(min-width: 992px) 50vw, 100vw' class='img-fluid' %}
+    """
+    attributes = format_html_join(' ', '{}="{}"', sorted(attrs.items()))
+    entry = _entries().get(name)
+    if entry is None:
+        return format_html('<img src="{}" alt="{}" loading="{}" {}>', static(name), alt, loading, attributes)
+
+    fallback = entry['variants'][entry['fallback']]
+    # Browsers take the first <source> they can decode, so the smallest format goes first
+    sources = format_html_join(
+        '', '<source type="{}" srcset="{}" sizes="{}">',
+        ((images.MIME_TYPES[fmt], _srcset(entry['variants'][fmt]), sizes)
+         for fmt in ('avif', 'webp') if fmt in entry['variants']),
+    )
+    return format_html(
+        '<picture>{}<img src="{}" srcset="{}" sizes="{}" width="{}" height="{}" alt="{}" '
+        'loading="{}" decoding="async" {}></picture>',
+        sources, static(fallback[-1][1]), _srcset(fallback), sizes, entry['width'], entry['height'],
+        alt, loading, attributes,
+    )
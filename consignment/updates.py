@@ -0,0 +1,140 @@
+import logging
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .geocoding import schedule_bulk_geocoding
+from .models import Package, TrackingEvent
+
+logger = logging.getLogger(__name__)
+
+STATUSES = {choice for choice, _ in Package.PACKAGE_STATUS_CHOICES}
+
+# Feed keys -> Package fields they overwrite
+UPDATE_FIELDS = {
+    'status': 'package_status',
+    'location': 'current_location',
+    'note': 'delivery_update',
+}
+
+# Feed values are checked against these before any row is locked
+MAX_LENGTHS = {field: Package._meta.get_field(field).max_length for field in UPDATE_FIELDS.values()}
+
+
+class UpdateReport:
+    def __init__(self):
+        self.updated = []
+        self.unchanged = 0
+        self.not_found = []
+        self.errors = []
+
+    def as_dict(self):
+        return {
+            'updated': len(self.updated),
+            'unchanged': self.unchanged,
+            'not_found': self.not_found,
+            'errors': self.errors,
+        }
+
+    def __str__(self):
+        return (f'{len(self.updated)} updated, {self.unchanged} unchanged, '
+                f'{len(self.not_found)} not found, {len(self.errors)} rejected')
+
+
+def apply_tracking_updates(updates):
+    """Apply a batch of carrier updates: dicts with tracking_code and any of status, location, note.
+
+    All packages are fetched with one tracking_code__in query and written
+    back with one bulk_update inside a transaction. Only rows whose values
+    actually change are written, and only their derived caches are dropped.
+    Missing keys (or None) leave a field as it is.
+    """
+    report = UpdateReport()
+    pending = {}
+    for update in updates:
+        code = update.get('tracking_code')
+        if code is not None and not isinstance(code, str):
+            report.errors.append({'update': update, 'error': 'tracking_code must be a string'})
+            continue
+        code = (code or '').strip()
+        if not code:
+            report.errors.append({'update': update, 'error': 'missing tracking_code'})
+            continue
+        try:
+            values = _field_values(update)
+        except ValueError as e:
+            report.errors.append({'tracking_code': code, 'error': str(e)})
+            continue
+        # Later entries for the same package win, as in the carrier's own ordering
+        pending.setdefault(code, {}).update(values)
+    if not pending:
+        return report
+
+    with transaction.atomic():
+        packages = {
+            package.tracking_code: package
+            for package in Package.objects.select_for_update().filter(tracking_code__in=list(pending))
+        }
+        report.not_found = [code for code in pending if code not in packages]
+
+        changed_fields = set()
+        for code, values in pending.items():
+            package = packages.get(code)
+            if package is None:
+                continue
+            changes = {field: value for field, value in values.items() if getattr(package, field) != value}
+            if not changes:
+                report.unchanged += 1
+                continue
+            package._previous = {field: getattr(package, field) for field in Package.LOCATION_FIELDS}
+            for field, value in changes.items():
+                setattr(package, field, value)
+            if 'current_location' in changes:
+                package.current_latitude = package.current_longitude = None
+                changed_fields.update(['current_latitude', 'current_longitude'])
+            package._changes = changes
+            changed_fields.update(changes)
+            report.updated.append(package)
+
+        if report.updated:
+            # bulk_update skips auto_now, and updated_at versions the cached pages
+            now = timezone.now()
+            for package in report.updated:
+                package.updated_at = now
+            changed_fields.add('updated_at')
+            Package.objects.bulk_update(report.updated, sorted(changed_fields), batch_size=1000)
+            TrackingEvent.objects.bulk_create([
+                TrackingEvent.for_package(package, now)
+                for package in report.updated
+                if {'package_status', 'current_location'} & package._changes.keys()
+            ], batch_size=1000)
+            transaction.on_commit(lambda: invalidate_updated(report.updated))
+    return report
+
+
+def _field_values(update):
+    """The Package fields one feed entry sets; ValueError names the first bad value"""
+    values = {}
+    for key, field in UPDATE_FIELDS.items():
+        value = update.get(key)
+        if value is None:
+            continue
+        if not isinstance(value, str):
+            raise ValueError(f'{key} must be a string')
+        if MAX_LENGTHS[field] and len(value) > MAX_LENGTHS[field]:
+            raise ValueError(f'{key} is longer than {MAX_LENGTHS[field]} characters')
+        values[field] = value
+    if 'package_status' in values and values['package_status'] not in STATUSES:
+        raise ValueError(f"unknown status {values['package_status']!r}")
+    return values
+
+
+def invalidate_updated(packages):
+    """Drop caches derived from the packages a bulk update changed, and nothing else"""
+    from .utils import tracking_map_cache_key
+
+    relocated = [package for package in packages if 'current_location' in package._changes]
+    cache.delete_many([tracking_map_cache_key(**package._previous) for package in relocated])
+    # Status, location and notes aren't printed on receipts, so stored receipts stay valid
+    schedule_bulk_geocoding([package.pk for package in relocated])
@@ -1,13 +1,21 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
 app_name = 'track'
 
+# The two views every tracking request goes through have async versions for ASGI
+if getattr(settings, 'ASYNC_VIEWS', False):
+    track_package, package_detail = views.atrack_package, views.apackage_detail
+else:
+    track_package, package_detail = views.track_package, views.package_detail
+
 urlpatterns = [
-    path('', views.track_package, name='track_package'),
+    path('', track_package, name='track_package'),
     #path('track/', views.track_package, name='track_package'),
-    path('package/<str:package_id>/', views.package_detail, name='package_detail'),
+    path('package/<str:package_id>/', package_detail, name='package_detail'),
     path('receipt/<str:package_id>/', views.generate_pdf, name='generate_pdf'),
+    path('api/tracking-updates/', views.tracking_updates, name='tracking_updates'),
     path('privacy-policy/', views.privacy_policy, name='privacy_policy'),
     path('terms-of-service/', views.terms_of_service, name='terms_of_service'),
     path('cookies-policy/', views.cookies_policy, name='cookies_policy'),
@@ -1,26 +1,80 @@
-import requests
-import plotly.graph_objects as go
-
-def geocode(address):
-    url = 'https://nominatim.openstreetmap.org/search'
-    params = {'q': address, 'format': 'json'}
-    headers = {'User-Agent': 'GeoMapper'}
-    response = requests.get(url, params=params, headers=headers)
-    data = response.json()
-    if data:
-        return float(data[0]['lat']), float(data[0]['lon'])
-    return None, None
-
-def generate_tracking_map(package):
-    # Step 1: Get locations
-    locations = [
-        package.sending_location,
-        package.current_location,
-        package.receiving_location
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .geocoding import ageocode_many, geocode_many
+from .models import Package
+
+# Bump whenever the figure below changes so cached fragments are not reused
+MAP_TEMPLATE_VERSION = 2
+
+
+def tracking_map_cache_key(sending_location, current_location, receiving_location):
+    route = '\x1f'.join(loc or '' for loc in (sending_location, current_location, receiving_location))
+    digest = hashlib.sha1(route.encode('utf-8')).hexdigest()
+    return f'tracking_map:v{MAP_TEMPLATE_VERSION}:{digest}'
+
+
+def generate_tracking_map(package, route=None):
+    """Return the route map HTML fragment, rendering it only on a cache miss"""
+    key = tracking_map_cache_key(package.sending_location, package.current_location, package.receiving_location)
+    map_html = cache.get(key)
+    if map_html is None:
+        map_html, complete = render_tracking_map(package, route)
+        # Don't keep a map drawn while some point could not be geocoded
+        if complete:
+            cache.set(key, map_html, getattr(settings, 'TRACKING_MAP_CACHE_TIMEOUT', 60 * 60 * 24 * 7))
+    return map_html
+
+
+def _unlocated(package):
+    # Use the stored coordinates, geocoding only rows not backfilled yet
+    return [getattr(package, field) for field in Package.LOCATION_FIELDS if None in package.coordinates_for(field)]
+
+
+def _route(package, resolved):
+    locations = [getattr(package, field) for field in Package.LOCATION_FIELDS]
+    coordinates = [
+        resolved[loc] if loc in resolved else package.coordinates_for(field)
+        for field, loc in zip(Package.LOCATION_FIELDS, locations)
     ]
+    return locations, coordinates
+
+
+def route_coordinates(package):
+    """Return ([sending, current, receiving] locations, their (lat, lon) pairs)"""
+    missing = _unlocated(package)
+    return _route(package, geocode_many(missing) if missing else {})
+
+
+async def aroute_coordinates(package):
+    """route_coordinates without blocking the event loop on Nominatim or the geocode cache"""
+    missing = _unlocated(package)
+    return _route(package, await ageocode_many(missing) if missing else {})
 
-    # Step 2: Geocode each location
-    coordinates = [geocode(loc) for loc in locations]
+
+def tracking_map_data(package, route=None):
+    """Compact route description drawn in the browser by static/js/tracking_map.js"""
+    locations, coordinates = route or route_coordinates(package)
+    if all(lat is None for lat, _ in coordinates):
+        return None
+    return {
+        'points': [
+            {'label': loc or '', 'lat': lat, 'lon': lon}
+            for loc, (lat, lon) in zip(locations, coordinates)
+        ],
+    }
+
+
+def render_tracking_map(package, route=None):
+    """Build the plotly figure; returns (html, whether every point was located)"""
+    import plotly.graph_objects as go
+
+    locations, coordinates = route or route_coordinates(package)
+    if all(lat is None for lat, _ in coordinates):
+        # Geocoding is unavailable or found nothing: leave the map out of the page
+        return '', False
     
     # Create completed route (origin to current)
     completed_route = go.Scattermapbox(
@@ -77,4 +131,7 @@ def generate_tracking_map(package):
         height=400
     )
 
-    return fig.to_html(full_html=False, config={'displayModeBar': False})
+    # plotly.js itself is loaded by package_detail.html
+    map_html = fig.to_html(full_html=False, include_plotlyjs=False, config={'displayModeBar': False})
+    return map_html, all(lat is not None for loc, (lat, _) in zip(locations, coordinates) if loc)
+
@@ -1,16 +1,27 @@
+import hmac
+import json
 import logging
-import os
-import tempfile
 
+from asgiref.sync import sync_to_async
 from django.conf import settings
-from django.http import HttpResponse, HttpResponseServerError
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, HttpResponseServerError, JsonResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.template.loader import render_to_string
-from .pdf import generate_receipt_pdf
-from .utils import generate_tracking_map
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
 from django.utils.safestring import mark_safe
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 
-from .models import Package
+from . import lookup, pages, receipts
+from .lazy import LazyModule
+from .models import Package, TrackingEvent
+from .updates import apply_tracking_updates
+
+# plotly is only imported by the first view that draws a map; receipts.py
+# defers reportlab the same way
+maps = LazyModule('consignment.utils')
 
 # Set up logging
 logger = logging.getLogger(__name__)
@@ -20,33 +31,128 @@ CONVERTAPI_SECRET = 'secret_TvNBjlPVoRE8F5oN'
 
 def package_detail(request, package_id):
     try:
-        package = get_object_or_404(Package, package_id=package_id)
-        map_html = generate_tracking_map(package)
-
-        context = {
-            'package': package,
-            'sender': package.sender,
-            'receiver': package.receiver,
-            'sending_location': package.sending_location,
-            'receiving_location': package.receiving_location,
-            'map_html': mark_safe(map_html),
-            'status_list': [status[1] for status in Package.PACKAGE_STATUS_CHOICES],
-            'status_index': [status[1] for status in Package.PACKAGE_STATUS_CHOICES].index(package.get_package_status_display()),
-            'status_percentage': (([status[1] for status in Package.PACKAGE_STATUS_CHOICES].index(package.get_package_status_display()) + 1) / len(Package.PACKAGE_STATUS_CHOICES)) * 100
-        }
-        return render(request, 'package_detail.html', context)
+        # One indexed query for updated_at versions the page; revalidation and cache hits need nothing else
+        version = pages.get_page_version(package_id)
+        if version is None:
+            raise Http404('No Package matches the given query.')
+        etag, last_modified = pages.page_validators(version)
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            return _page_cache_headers(not_modified, etag, last_modified)
+        page = pages.get_cached_page(package_id, version)
+        if page is None:
+            package = get_object_or_404(Package, package_id=package_id)
+            page = render_package_page(package)
+            pages.store_page(package, page)
+            version = pages.version_token(package.updated_at)
+        response = render(request, 'package_detail.html', {**page, 'page_body': mark_safe(page['page_body'])})
+        return _page_cache_headers(response, *pages.page_validators(version))
+    except Http404:
+        raise
+    except Exception as e:
+        logger.error(f"Error in package_detail view: {e}")
+        return HttpResponseServerError("An error occurred while retrieving package details.")
+
+async def apackage_detail(request, package_id):
+    """package_detail for ASGI: waits on the cache, database and Nominatim don't tie up a thread"""
+    try:
+        version = await pages.aget_page_version(package_id)
+        if version is None:
+            raise Http404('No Package matches the given query.')
+        etag, last_modified = pages.page_validators(version)
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            return _page_cache_headers(not_modified, etag, last_modified)
+        page = await pages.aget_cached_page(package_id, version)
+        if page is None:
+            package = await Package.objects.aget(package_id=package_id)
+            page = await arender_package_page(package)
+            await pages.astore_page(package, page)
+            version = pages.version_token(package.updated_at)
+        response = render(request, 'package_detail.html', {**page, 'page_body': mark_safe(page['page_body'])})
+        return _page_cache_headers(response, *pages.page_validators(version))
+    except Http404:
+        raise
+    except Package.DoesNotExist:
+        # Deleted between the version query and the fetch
+        raise Http404('No Package matches the given query.')
     except Exception as e:
         logger.error(f"Error in package_detail view: {e}")
         return HttpResponseServerError("An error occurred while retrieving package details.")
 
+def _page_cache_headers(response, etag, last_modified):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    # The page carries a CSRF token, so only the visitor's own browser may keep it
+    patch_cache_control(response, private=True, max_age=getattr(settings, 'PACKAGE_PAGE_MAX_AGE', 0),
+                        must_revalidate=True)
+    return response
+
+def _client_map():
+    # 'client' ships coordinates only and lets static/js/tracking_map.js draw the route
+    return getattr(settings, 'TRACKING_MAP_MODE', 'server') == 'client'
+
+def _latest_events(package):
+    # One indexed query on (package, timestamp) for the history, newest first
+    return TrackingEvent.objects.latest_for(package, getattr(settings, 'TRACKING_TIMELINE_LENGTH', 10))
+
+def render_package_page(package):
+    """Context of the detail page's outer template, with the package body pre-rendered"""
+    if _client_map():
+        map_html, map_data = '', maps.tracking_map_data(package)
+    else:
+        map_html, map_data = maps.generate_tracking_map(package), None
+    return _package_page(package, list(_latest_events(package)), map_html, map_data)
+
+async def arender_package_page(package):
+    """render_package_page with the events query and any geocoding awaited"""
+    events = [event async for event in _latest_events(package)]
+    route = await maps.aroute_coordinates(package)
+    if _client_map():
+        map_html, map_data = '', maps.tracking_map_data(package, route)
+    else:
+        # Drawing the plotly figure is CPU-bound, so keep it off the event loop
+        map_html = await sync_to_async(maps.generate_tracking_map, thread_sensitive=False)(package, route)
+        map_data = None
+    return _package_page(package, events, map_html, map_data)
+
+def _package_page(package, events, map_html, map_data):
+    context = {
+        'package': package,
+        'events': events,
+        'sender': package.sender,
+        'receiver': package.receiver,
+        'sending_location': package.sending_location,
+        'receiving_location': package.receiving_location,
+        'map_html': mark_safe(map_html),
+        'map_data': map_data,
+        'status_list': [status[1] for status in Package.PACKAGE_STATUS_CHOICES],
+        'status_index': [status[1] for status in Package.PACKAGE_STATUS_CHOICES].index(package.get_package_status_display()),
+        'status_percentage': (([status[1] for status in Package.PACKAGE_STATUS_CHOICES].index(package.get_package_status_display()) + 1) / len(Package.PACKAGE_STATUS_CHOICES)) * 100
+    }
+    # Plain strings only, so the page pickles cheaply into any cache backend
+    return {
+        'tracking_code': package.tracking_code,
+        'client_map': map_data is not None,
+        'page_body': str(render_to_string('package_detail_body.html', context)),
+    }
+
 def track_package(request):
     if request.method == 'POST':
-        tracking_code = request.POST.get('tracking_code')
+        tracking_code = lookup.normalize_code(request.POST.get('tracking_code'))
+        if not lookup.take_token(lookup.client_ip(request)):
+            return render(request, 'index.html', {
+                'error_message': 'Too many tracking requests. Please wait a minute and try again.'
+            }, status=429)
         if tracking_code:
+            if not lookup.is_well_formed(tracking_code):
+                return render(request, 'index.html', {
+                    'error_message': "That doesn't look like a tracking code. Codes start with CE followed by 14 digits."
+                })
             try:
-                package = Package.objects.filter(tracking_code=tracking_code).first()
-                if package:
-                    return redirect('track:package_detail', package_id=package.package_id)
+                package_id = lookup.find_package_id(tracking_code)
+                if package_id:
+                    return redirect('track:package_detail', package_id=package_id)
                 else:
                     return render(request, 'index.html', {
                         'error_message': "Package with this tracking code does not exist."
@@ -63,22 +169,86 @@ def track_package(request):
 
     return render(request, 'index.html')
 
-def generate_pdf(request, package_id):
-    # Create a new HTTP response with PDF content type
-    response = HttpResponse(content_type='application/pdf')
+async def atrack_package(request):
+    """track_package for ASGI, with the rate limit, lookup cache and query awaited"""
+    if request.method == 'POST':
+        tracking_code = lookup.normalize_code(request.POST.get('tracking_code'))
+        if not await lookup.atake_token(lookup.client_ip(request)):
+            return render(request, 'index.html', {
+                'error_message': 'Too many tracking requests. Please wait a minute and try again.'
+            }, status=429)
+        if tracking_code:
+            if not lookup.is_well_formed(tracking_code):
+                return render(request, 'index.html', {
+                    'error_message': "That doesn't look like a tracking code. Codes start with CE followed by 14 digits."
+                })
+            try:
+                package_id = await lookup.afind_package_id(tracking_code)
+                if package_id:
+                    return redirect('track:package_detail', package_id=package_id)
+                else:
+                    return render(request, 'index.html', {
+                        'error_message': "Package with this tracking code does not exist."
+                    })
+            except Exception as e:
+                logger.error(f"Error in track_package view: {e}")
+                return render(request, 'index.html', {
+                    'error_message': 'An error occurred while tracking the package.'
+                })
+        else:
+            return render(request, 'index.html', {
+                'error_message': 'Please enter a tracking code.'
+            })
 
-    # Set Content-Disposition to 'inline' to render the PDF in the browser
-    response['Content-Disposition'] = f'inline; filename="package_receipt_{package_id}.pdf"'
+    return render(request, 'index.html')
 
+def generate_pdf(request, package_id):
     # Get the Package object
     package = get_object_or_404(Package, package_id=package_id)
 
-    # Call the function from pdf.py to generate the receipt
-    generate_receipt_pdf(response, package)
+    # Receipts are stored under a hash of what they print, which doubles as the ETag
+    digest = receipts.receipt_digest(package)
+    etag = f'"{digest}"'
+    last_modified = int(package.updated_at.timestamp())
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is None:
+        path = receipts.get_or_create_receipt(package, digest)
+        response = FileResponse(default_storage.open(path, 'rb'), content_type='application/pdf')
+        # Set Content-Disposition to 'inline' to render the PDF in the browser
+        response['Content-Disposition'] = f'inline; filename="package_receipt_{package_id}.pdf"'
+    else:
+        response = not_modified
 
-    # Return the generated PDF as the response (will be displayed in browser)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    # Receipts hold customer details: browsers may keep them, shared caches may not
+    patch_cache_control(response, private=True, max_age=getattr(settings, 'RECEIPT_MAX_AGE', 300))
     return response
 
+@csrf_exempt
+@require_POST
+def tracking_updates(request):
+    """Carrier feed endpoint: apply a JSON batch of status/location updates.
+
+    Expects ``Authorization: Token <CARRIER_FEED_TOKEN>`` and a body of
+    ``{"updates": [{"tracking_code": ..., "status": ..., "location": ..., "note": ...}]}``.
+    """
+    token = getattr(settings, 'CARRIER_FEED_TOKEN', '')
+    supplied = request.headers.get('Authorization', '').removeprefix('Token ').strip()
+    if not token or not hmac.compare_digest(supplied, token):
+        return JsonResponse({'error': 'invalid token'}, status=403)
+    try:
+        payload = json.loads(request.body)
+        updates = payload['updates'] if isinstance(payload, dict) else payload
+        if not isinstance(updates, list) or not all(isinstance(update, dict) for update in updates):
+            raise ValueError('updates must be a list of objects')
+    except (ValueError, KeyError) as e:
+        return JsonResponse({'error': f'invalid payload: {e}'}, status=400)
+
+    report = apply_tracking_updates(updates)
+    logger.info(f"Carrier feed: {report}")
+    return JsonResponse(report.as_dict())
+
 def privacy_policy(request):
     return render(request, 'legal/privacy_policy.html')
 
@@ -0,0 +1,49 @@
+/**
+ * Draws the shipment route on package_detail.html when TRACKING_MAP_MODE = 'client'.
+ * Reads the points emitted by the view in #tracking-map-data and mirrors the
+ * figure utils.render_tracking_map builds server-side.
+ */
+
+(function() {
+  "use strict";
+
+  function drawTrackingMap() {
+    const container = document.getElementById('tracking-map');
+    const dataElement = document.getElementById('tracking-map-data');
+    if (!container || !dataElement || typeof Plotly === 'undefined') return;
+
+    const points = JSON.parse(dataElement.textContent).points;
+    const [origin, current, destination] = points;
+
+    function segment(from, to, colors, lineColor, name) {
+      return {
+        type: 'scattermapbox',
+        mode: 'markers+lines',
+        lat: [from.lat, to.lat],
+        lon: [from.lon, to.lon],
+        text: [from.label, to.label],
+        marker: { size: 12, color: colors },
+        line: { width: 3, color: lineColor },
+        name: name
+      };
+    }
+
+    const located = points.filter(point => point.lat !== null && point.lon !== null);
+    const center = {
+      lat: located.reduce((sum, point) => sum + point.lat, 0) / located.length,
+      lon: located.reduce((sum, point) => sum + point.lon, 0) / located.length
+    };
+
+    Plotly.newPlot(container, [
+      segment(origin, current, ['#4CAF50', '#FF9800'], 'blue', 'Our warehouse'),
+      segment(current, destination, ['blue', 'red'], 'gray', 'On Route to Destination')
+    ], {
+      mapbox: { style: 'carto-positron', zoom: 5, center: center },
+      showlegend: false,
+      margin: { r: 0, t: 0, l: 0, b: 0 },
+      height: 400
+    }, { displayModeBar: false });
+  }
+
+  document.addEventListener('DOMContentLoaded', drawTrackingMap);
+})();